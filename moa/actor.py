@@ -11,11 +11,18 @@ moa.actor
 
 'Simple' wrapper around subprocess to execute code
 """
-import fcntl
+import errno
+import hashlib
 import os
+import re
+import pipes
+import select
 import subprocess
 import sys
+import uuid
 
+import moa.utils
+import moa.pathlist
 import moa.logger
 import moa.ui
 from moa.sysConf import sysConf
@@ -48,13 +55,175 @@ def getRunner():
 #should use this
 getActor = getRunner
 
+#: no bytes read from a process' output at once
+BUFSIZE = 1 << 16
+
+#: environment values longer than this (bytes) are also written to a
+#: file, passed by path in `<name>_file` (lists one item per line) -
+#: python scripts get these with :func:`moa.script.getArgs`
+FILEVALUE = 32 * 1024
+
+#: maximum length (bytes) of a single environment string, `name=value`
+#: (MAX_ARG_STRLEN on Linux) - longer values are only passed by file
+MAXENVSTRING = 32 * 4096
+
+#: environment of the shared data of map items: token -> env
+_SHAREDENV = {}
+
+
+def _valueFile(wd, data):
+    """
+    Store a (large) value in a file - named by its digest, so each
+    value is written once - & return the path
+    """
+    tmpDir = os.path.join(os.path.abspath(wd), '.moa', 'tmp')
+    fileName = os.path.join(
+        tmpDir, 'env.%s' % hashlib.sha1(data).hexdigest())
+    if not os.path.exists(fileName):
+        try:
+            os.makedirs(tmpDir)
+        except OSError:
+            pass
+        moa.utils.atomicWrite(fileName, data)
+    return fileName
+
+
+def envVars(conf, wd):
+    """
+    Return the environment variables for a configuration - each value
+    as is & prefixed with 'moa_'. Lists are joined by spaces, dicts
+    are skipped. Large values are (also) passed by file, values too
+    large for the environment only by file
+
+    >>> envVars({'a': 1, 'b': ['x', 'y'], 'c': {}}, '.') == \\
+    ...     {'a': '1', 'moa_a': '1', 'b': 'x y', 'moa_b': 'x y'}
+    True
+    >>> import tempfile
+    >>> wd = tempfile.mkdtemp()
+    >>> env = envVars({'b': ['f%d' % i for i in range(10000)]}, wd)
+    >>> sorted(env)
+    ['b', 'b_file', 'moa_b', 'moa_b_file']
+    >>> open(env['b_file']).read().split()[:2]
+    ['f0', 'f1']
+    >>> sorted(envVars({'b': ['f%d' % i for i in range(30000)]}, wd))
+    ['b_file', 'moa_b_file']
+    """
+    rv = {}
+    for k in conf.keys():
+        v = conf[k]
+        if isinstance(v, dict):
+            continue
+        if not re.match(r'^[A-Za-z_]\w*$', k):
+            continue
+        isList = isinstance(v, (list, moa.pathlist.PathList))
+        if isList:
+            value = " ".join(v)
+        else:
+            value = str(v)
+        fileName = None
+        if len(value) > FILEVALUE:
+            if isList:
+                fileName = _valueFile(wd, "\n".join(v) + "\n")
+            else:
+                fileName = _valueFile(wd, value)
+        for name in [k, 'moa_' + k]:
+            if len(name) + len(value) + 2 <= MAXENVSTRING:
+                rv[name] = value
+            if fileName is not None:
+                rv[name + '_file'] = fileName
+    return rv
+
+
+def _names(k):
+    return [k, 'moa_' + k, k + '_file', 'moa_' + k + '_file']
+
+
+def taskEnv(conf, wd):
+    """
+    Return the environment (a dict) to run a task with: the
+    environment of moa plus the variables of the configuration. For
+    a map item, the variables of the data shared by all items are
+    determined once, only the item's own variables are added
+    """
+    #import here - the ruff backend imports this module
+    from moa.backend.ruff.jobdata import ItemData
+    if not isinstance(conf, ItemData):
+        env = dict(os.environ)
+        env.update(envVars(conf, wd))
+        return env
+
+    shared, overlay = conf.shared, conf.overlay
+    base = _SHAREDENV.get(shared.token)
+    if base is None:
+        base = dict(os.environ)
+        base.update(envVars(shared.data, wd))
+        _SHAREDENV[shared.token] = base
+    env = dict(base)
+    for k in overlay:
+        for name in _names(k):
+            env.pop(name, None)
+    env.update(envVars(overlay, wd))
+    return env
+
+
+def shellExports(conf, wd):
+    """
+    Return shell statements setting the variables of a configuration
+    (on top of whatever is set already)
+    """
+    rv = []
+    env = envVars(conf, wd)
+    for k in sorted(conf.keys()):
+        unset = [x for x in _names(k) if not x in env]
+        if unset:
+            rv.append("unset %s" % " ".join(unset))
+    for k in sorted(env):
+        rv.append("export %s=%s" % (k, pipes.quote(env[k])))
+    return rv
+
+def _select(fds, timeout=None):
+    """
+    select() on readable file descriptors - retrying when interrupted
+    by a signal
+    """
+    while True:
+        try:
+            return select.select(fds, [], [], timeout)[0]
+        except select.error, e:
+            if e[0] != errno.EINTR:
+                raise
+
+
+def _tee(p, streams):
+    """
+    Copy the output of a process, as it arrives, to a number of files
+    - until the process closed its output or has ended (& no more
+    output arrives: a background child might keep the pipes open)
+
+    :param streams: list of (pipe, [files to copy to])
+    """
+    targets = dict([(pipe.fileno(), files) for pipe, files in streams])
+    while targets:
+        ready = _select(targets.keys(), 1.0)
+        if not ready and p.poll() is not None:
+            break
+        for fd in ready:
+            data = os.read(fd, BUFSIZE)
+            if not data:
+                del targets[fd]
+                continue
+            for F in targets[fd]:
+                F.write(data)
+                F.flush()
+
+
 @sync
 def simpleRunner(wd, cl, conf={}, **kwargs):
     """
     Don't think - just run - here & now
 
     what does this function do?
-    - put env in the environment
+    - run with the configuration in the environment
     - Execute the commandline (in cl)
     - store stdout & stderr in log files
     - return the rc
@@ -70,84 +239,210 @@ def simpleRunner(wd, cl, conf={}, **kwargs):
         except OSError:
             pass
 
-    #dump the configuration in the environment
-    for k in conf:
-        # to prevent collusion, prepend all env variables
-        # with 'moa_'
-        outk = 'moa_' + k
-        v = conf[k]
-        if isinstance(v, list):
-            os.putenv(outk, " ".join(v))
-        elif isinstance(v, dict):
-            continue
-        else:
-            os.putenv(outk, str(v))
+    #the configuration goes in the environment of the task
+    env = taskEnv(conf, wd)
 
     SOUT = open(os.path.join(outDir, 'stdout'), 'a')
     SERR = open(os.path.join(outDir, 'stderr'), 'a')
     l.debug("executing %s" % " ".join(cl))
 
     if sysConf.options.silent or sysConf.force_silent:
-        p = subprocess.Popen(cl, cwd=wd, stdout=SOUT, stderr=SERR)
+        p = subprocess.Popen(cl, cwd=wd, env=env, stdout=SOUT, stderr=SERR)
         p.communicate()
         return p.returncode
 
     #non silent - split output to the output files &
     #stdout/stderr
     p = subprocess.Popen(
-        cl, cwd=wd, shell=False,
+        cl, cwd=wd, shell=False, env=env,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE)
 
-    #make the file handles non-blocking
-    fdout = p.stdout.fileno()
-    flout = fcntl.fcntl(fdout, fcntl.F_GETFL)
-    fcntl.fcntl(fdout, fcntl.F_SETFL, flout | os.O_NONBLOCK)
+    _tee(p, [(p.stdout, [sys.stdout, SOUT]),
+             (p.stderr, [sys.stderr, SERR])])
 
-    fderr = p.stderr.fileno()
-    flerr = fcntl.fcntl(fderr, fcntl.F_GETFL)
-    fcntl.fcntl(fderr, fcntl.F_SETFL, flerr | os.O_NONBLOCK)
+    #return returncode
+    return p.wait()
 
-    #now start polling & output the data
-    while True:
-        if p.poll() is not None:
-            break
-        try:
-            o = p.stdout.read(1024)
-            sys.stdout.write(o)
-            SOUT.write(o)
-        except IOError:
-            pass
+
+class WarmShell(object):
+    """
+    A persistent (login) shell executing scripts fed to it over a
+    pipe - the shell & profile start up is paid once.
+
+    Each script is sourced in a subshell (which resets the working
+    directory & environment for the next script), with its stdin
+    from /dev/null. The end of its output is marked by a sentinel on
+    both stdout & stderr, the one on stdout carries the return code.
+
+    :param shell: shell command line, e.g. '/bin/bash -el'; the shell
+      starts as a login shell if called with -l; with -e, every
+      script runs with `set -e`
+    :param env: environment to start the shell with - each script
+      only sets the variables that differ from it
+    """
+    def __init__(self, shell, env=None):
+        args = shell.split()
+        flags = "".join([x[1:] for x in args[1:]
+                         if re.match(r'^-[a-z]+$', x)])
+        cl = [args[0]]
+        if 'l' in flags:
+            cl.append('-l')
+        cl.append('-s')
+        self.errexit = 'e' in flags
+        self.sentinel = '__moa_%s__' % uuid.uuid4().hex
+        self.sentinelRe = re.compile(self.sentinel + r' (\d*)\n')
+        self.env = env or dict(os.environ)
+        self.p = subprocess.Popen(
+            cl, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, close_fds=True, env=self.env)
+        #discard anything the profile prints
+        self._send("")
+        self._collect(lambda x: None, lambda x: None)
+
+    def alive(self):
+        return self.p.poll() is None
+
+    def _send(self, code):
+        self.p.stdin.write(
+            "%s\nprintf '%%s %%d\\n' %s $?\nprintf '%%s \\n' %s >&2\n" % (
+                code, self.sentinel, self.sentinel))
+        self.p.stdin.flush()
+
+    def _collect(self, out, err):
+        """
+        Forward the output of a script until the sentinels - returns
+        the rc (None if the shell died)
+        """
+        streams = {self.p.stdout.fileno(): out, self.p.stderr.fileno(): err}
+        buffers = dict([(fd, '') for fd in streams])
+        rc = None
+        while streams:
+            ready = _select(streams.keys())
+            for fd in ready:
+                data = os.read(fd, BUFSIZE)
+                if not data:
+                    #the shell died
+                    streams[fd](buffers[fd])
+                    del streams[fd]
+                    continue
+                buf = buffers[fd] + data
+                match = self.sentinelRe.search(buf)
+                if match:
+                    streams[fd](buf[:match.start()])
+                    if fd == self.p.stdout.fileno():
+                        rc = int(match.group(1))
+                    del streams[fd]
+                    continue
+                #keep what might be the start of the sentinel
+                keep = len(self.sentinel) + 8
+                streams[fd](buf[:-keep])
+                buffers[fd] = buf[-keep:]
+        if not self.alive():
+            return None
+        return rc
+
+    def run(self, wd, script, env, out, err):
+        """
+        Run a script (file) - returns the return code
+
+        :param env: environment (dict) to run the script with
+        :param out: function receiving the stdout of the script
+        :param err: function receiving the stderr of the script
+        """
+        code = ["(", "cd %s || exit 1" % pipes.quote(wd)]
+        if self.errexit:
+            code.append("set -e")
+        unset = [k for k in self.env if not k in env]
+        if unset:
+            code.append("unset %s" % " ".join(sorted(unset)))
+        for k in sorted(env):
+            if self.env.get(k) != env[k]:
+                code.append("export %s=%s" % (k, pipes.quote(env[k])))
+        code.append(". %s" % pipes.quote(script))
+        code.append(") < /dev/null")
+        self._send("\n".join(code))
+        rc = self._collect(out, err)
+        if rc is None:
+            return self.p.wait() or 1
+        return rc
+
+    def close(self):
+        if self.alive():
+            self.p.stdin.close()
+            self.p.wait()
+
+
+#: the warm shell of this process (by pid - forked workers start
+#: their own)
+_WARM = {}
+
+
+def _warmShell(env):
+    shell = _WARM.get(os.getpid())
+    if shell is None or not shell.alive():
+        shell = WarmShell(sysConf.default_shell, env)
+        _WARM[os.getpid()] = shell
+    return shell
+
+
+def _isShellScript(fileName):
+    """
+    Can this script be run by the warm shell - i.e. is it a bash/sh
+    script
+    """
+    with open(fileName) as F:
+        firstline = F.readline()
+    if not firstline.startswith('#!'):
+        return True
+    shell = firstline[2:].split()
+    return bool(shell) and os.path.basename(shell[0]) in ['bash', 'sh']
+
+
+@sync
+def warmRunner(wd, cl, conf={}, **kwargs):
+    """
+    Run a script in the warm shell of this process - falls back to
+    the simpleRunner for anything else than a single bash/sh script
+
+    - feed the script to the shell, with the configuration in the
+      environment
+    - store stdout & stderr in log files
+    - return the rc
+    """
+    if len(cl) != 1 or not _isShellScript(cl[0]):
+        return simpleRunner(wd, cl, conf, **kwargs)
+
+    outDir = os.path.join(wd, '.moa', 'log.latest')
+    if not os.path.exists(outDir):
         try:
-            e = p.stderr.read(1024)
-            sys.stderr.write(e)
-            SERR.write(e)
-        except IOError:
+            os.makedirs(outDir)
+        except OSError:
             pass
 
-        sys.stdout.flush()
-        sys.stderr.flush()
+    SOUT = open(os.path.join(outDir, 'stdout'), 'a')
+    SERR = open(os.path.join(outDir, 'stderr'), 'a')
+    silent = sysConf.options.silent or sysConf.force_silent
 
-    #make sure that nothing is left
-    try:
-        o = p.stdout.read()
-        sys.stdout.write(o)
-        SOUT.write(o)
-    except IOError:
-        pass
+    def forward(logFile, stream):
+        def _forward(data):
+            if not data:
+                return
+            logFile.write(data)
+            if not silent:
+                stream.write(data)
+                stream.flush()
+        return _forward
 
+    l.debug("executing %s in a warm shell" % cl[0])
     try:
-        e = p.stderr.read()
-        sys.stderr.write(e)
-        SERR.write(e)
-    except IOError:
-        pass
-
-    sys.stdout.flush()
-    sys.stderr.flush()
-
-    #return returncode
-    return p.returncode
+        env = taskEnv(conf, wd)
+        return _warmShell(env).run(
+            os.path.abspath(wd), os.path.abspath(cl[0]), env,
+            forward(SOUT, sys.stdout), forward(SERR, sys.stderr))
+    finally:
+        SOUT.close()
+        SERR.close()
 
 
 def getRecentOutDir(job):
@@ -193,5 +488,6 @@ def getLastStderr(job):
 #set up some actor data in the sysConf
 sysConf.actor = {}
 sysConf.actor.actors = {
-    'default': simpleRunner
+    'default': simpleRunner,
+    'warm': warmRunner,
 }
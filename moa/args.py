@@ -179,6 +179,10 @@ def getParser(reuse=True):
         hlptxt = ("Command legend: '.' can be executed everywhere; " +
                   "'j' require a job; '*' are specified by the template")
 
+        parser.add_argument(
+            "--timings", dest="timings", action="store_true",
+            help="Report the time spent in each phase of this run")
+
         commandParser = parser.add_subparsers(
             title='command', help='Moa Command', dest='command',
             description=hlptxt)
@@ -190,6 +194,68 @@ def getParser(reuse=True):
         return parser, commandParser
 
 
+class CommandParser(object):
+    """
+    Placeholder for the argparse subparser of a command.
+
+    Arguments are recorded and the real subparser is only created
+    (see :func:`buildCommandParser`) when the command is going to be
+    parsed - or when the full help is needed - saving the cost of
+    building a subparser for every known command on each invocation.
+
+    :param setup: optional function, called with the real subparser
+      once it is created, to add more arguments.
+    """
+    def __init__(self, name, setup=None, **kwargs):
+        self.name = name
+        self.setup = setup
+        self.kwargs = kwargs
+        self.arguments = []
+        self.parser = None
+        _commandParsers.append(self)
+
+    def add_argument(self, *args, **kwargs):
+        if self.parser is not None:
+            return self.parser.add_argument(*args, **kwargs)
+        self.arguments.append((args, kwargs))
+
+    def build(self):
+        """
+        Create the argparse subparser (if not done yet) & return it
+        """
+        if self.parser is not None:
+            return self.parser
+        parser, cparser = getParser()
+        self.parser = cparser.add_parser(self.name, **self.kwargs)
+        for args, kwargs in self.arguments:
+            self.parser.add_argument(*args, **kwargs)
+        if self.setup:
+            self.setup(self.parser)
+        return self.parser
+
+#: all command parsers, in order of registration
+_commandParsers = []
+
+
+def buildCommandParser(name):
+    """
+    Build the subparser for a single command
+    """
+    if not name in sysConf.commands:
+        return
+    cp = sysConf.commands[name].get('cp')
+    if cp is not None:
+        cp.build()
+
+
+def buildAllCommandParsers():
+    """
+    Build the subparsers of all commands (for example for `moa -h`)
+    """
+    for cp in _commandParsers:
+        cp.build()
+
+
 #
 # Decorators - @command must always come last (hence - is executed first)
 #
@@ -218,9 +284,7 @@ def _commandify(f, name):
     if longDesc:
         longDesc = moa.utils.removeIndent(longDesc)
 
-    parser, cparser = getParser()
-
-    cp = cparser.add_parser(
+    cp = CommandParser(
         name, help=shortDesc,
         description="%s\n%s" % (shortDesc, longDesc),
         formatter_class=MoaHelpFormatter)
@@ -234,6 +298,9 @@ def _commandify(f, name):
     cp.add_argument("--profile", dest="profile", action="store_true",
                     help="Run the profiler")
 
+    cp.add_argument("--timings", dest="timings", action="store_true",
+                    help="Report the time spent in each phase of this run")
+
     sysConf.commands[name] = {
         'desc': shortDesc,
         'long': longDesc,
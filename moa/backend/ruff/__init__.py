@@ -121,15 +121,6 @@ def executor(input, output, script, jobData):
     tf.close()
     os.chmod(tf.name, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
 
-    for k in jobData:
-        v = jobData[k]
-        if isinstance(v, list):
-            os.putenv(k, " ".join(v))
-        elif isinstance(v, dict):
-            continue
-        else:
-            os.putenv(k, str(v))
-
     runner = moa.actor.getRunner()
     rc = runner(jobData['wd'],  [tf.name], jobData)
     if rc != 0:
@@ -19,13 +19,17 @@ import ruffus.ruffus_exceptions
 
 from jinja2 import Template as jTemplate
 
+import moa.ui
 import moa.utils
+import moa.pathlist
 import moa.template
 import moa.backend
 import moa.logger as l
 from moa.sysConf import sysConf
 
 from moa.backend.ruff.commands import RuffCommands
+from moa.backend.ruff import uptodate
+from moa.backend.ruff import native
 
 import Yaco
 
@@ -70,11 +74,71 @@ class RuffBaseJob(object):
         """
         Load job data, configuration into the jobConf
         """
-        self.jobData.update(sysConf.job.data.simple())
+        self.jobData.update(moa.pathlist.simple(sysConf.job.data))
         self.jobData.update(sysConf.job.conf.render())
         self.jobData['wd'] = sysConf.job.wd
         self.jobData['silent'] = False #sysConf.options.silent
         
+    def getHashCheck(self, fileNames):
+        """
+        Return a content based up-to-date checker if running in `hash`
+        mode (otherwise None) - hashes `fileNames` upfront
+        """
+        if uptodate.getMode(self.args) != 'hash':
+            return None
+        check = uptodate.HashCheck(self.job.wd, self.command)
+        check.prepare(fileNames)
+        return check
+
+    def getExecutor(self):
+        """
+        Return the executor for this run: `ruffus` or `native` - from
+        the command line, the template's command definition or the
+        configuration (in that order)
+        """
+        executor = getattr(self.args, 'executor', None)
+        if not executor:
+            executor = self.job.template.commands[self.command].get(
+                'executor')
+        if not executor:
+            executor = sysConf.get('executor') or 'ruffus'
+        if not executor in native.EXECUTORS:
+            moa.ui.exitError("Invalid executor: %s" % executor)
+        return executor
+
+    def getBatchSize(self):
+        """
+        Return the number of items to run in one script - from the
+        command line or the template's command definition
+        """
+        batchSize = getattr(self.args, 'batch_size', None)
+        if not batchSize:
+            batchSize = self.job.template.commands[self.command].get(
+                'batch_size')
+        try:
+            batchSize = int(batchSize or 1)
+        except ValueError:
+            moa.ui.exitError("Invalid batch size: %s" % batchSize)
+        return max(1, batchSize)
+
+    def runNative(self, items, check=None):
+        """
+        Run items with the native executor - returns the return code
+        """
+        l.debug("Start native run (with %d process(es))" %
+                self.args.threads)
+        executor = native.NativeExecutor(self.args.threads, check)
+        failed = executor.run(items)
+        if not failed:
+            l.debug("Finished running (with %d process(es))" %
+                    self.args.threads)
+            return 0
+        moa.ui.error("Caught an execution error")
+        for key, message in failed:
+            l.debug(message)
+            moa.ui.error("While  processing: %s" % key.replace("\t", " "))
+        moa.ui.exitError("Quitting")
+
     def writeScript(self):
         """
         Render & write the script to a tempfile
@@ -0,0 +1,191 @@
+"""
+Ruff
+----
+
+Batched execution of map items.
+
+Each map item normally runs its own script, in its own shell (by
+default a login shell, sourcing all profile files). For many small
+items, shell start up dominates. With `batch_size` set (on the
+command in the template, or `moa run --batch_size N`), the scripts of
+up to N out-of-date items are combined into one script, so the shell
+starts once per batch.
+
+Up-to-date checking is done per item, before batching. In the batch
+script every item runs in a subshell (with its own environment
+variables & `set -e` if its shell was called with `-e`); its return
+code is appended to an rc file, from which the executor journals &
+records every item separately. Each item's output is written to its
+own log files (`.moa/log.d/<runId>/items/<no>.out|err`, empty ones
+are removed afterwards) & copied to the output of the batch once the
+item finishes.
+
+Only scripts run by bash or sh can be batched, others run by
+themselves.
+
+>>> s = script([(1, '#!/bin/bash -el\\necho a', {'input': 'a b'})],
+...            '/tmp/rc', '/tmp/log')
+>>> print "\\n".join(s.split("\\n")[:8])
+#!/bin/bash -el
+set +e
+(
+set -e
+unset input_file moa_input_file
+export input='a b'
+export moa_input='a b'
+eval 'echo a'
+>>> canBatch('#!/usr/bin/env python\\nprint 1')
+False
+"""
+
+import os
+import re
+import pipes
+
+import moa.actor
+import moa.logger
+
+l = moa.logger.getLogger(__name__)
+
+#: shells of which scripts can be batched
+SHELLS = ['bash', 'sh']
+
+
+def _shebang(script):
+    """
+    Return (shell, shell arguments, script body) - or None if the
+    script is not a bash/sh script
+    """
+    if not script.startswith('#!'):
+        return None
+    firstline, body = (script.split("\n", 1) + [''])[:2]
+    parts = firstline[2:].split()
+    if not parts or not os.path.basename(parts[0]) in SHELLS:
+        return None
+    return parts[0], parts[1:], body
+
+
+def canBatch(script):
+    """
+    Can this script be run as part of a batch?
+    """
+    return _shebang(script) is not None
+
+
+def script(items, rcFile, logDir, wd='.'):
+    """
+    Combine the scripts of a number of items into one
+
+    :param items: list of (item no, script, item variables)
+    :param rcFile: file to append the return codes to
+    :param logDir: directory for the items' log files
+    :param wd: job directory
+    """
+    shell, args, body = _shebang(items[0][1])
+    lines = ["#!%s" % " ".join([shell] + args), "set +e"]
+    for no, itemScript, env in items:
+        shell, args, body = _shebang(itemScript)
+        out = pipes.quote(os.path.join(logDir, '%d.out' % no))
+        err = pipes.quote(os.path.join(logDir, '%d.err' % no))
+        lines.append("(")
+        if [x for x in args if re.match(r'^-[a-z]*e', x)]:
+            lines.append("set -e")
+        lines.extend(moa.actor.shellExports(env, wd))
+        #eval: the body is parsed as it runs, like a script
+        lines.append("eval %s" % pipes.quote(body))
+        lines.append(") > %s 2> %s" % (out, err))
+        lines.append("echo \"%d $?\" >> %s" % (no, pipes.quote(rcFile)))
+        lines.append("[ -s %s ] && cat %s" % (out, out))
+        lines.append("[ -s %s ] && cat %s >&2" % (err, err))
+    return "\n".join(lines) + "\n"
+
+
+def cleanLogs(logDir, nos):
+    """
+    Remove the empty log files of the items of a batch
+    """
+    for no in nos:
+        for ext in ['out', 'err']:
+            fileName = os.path.join(logDir, '%d.%s' % (no, ext))
+            try:
+                if os.path.getsize(fileName) == 0:
+                    os.unlink(fileName)
+            except OSError:
+                pass
+
+
+def readRcs(rcFile):
+    """
+    Read the return codes of the items of a batch - returns a dict:
+    item no -> rc (items that did not finish are missing)
+    """
+    rcs = {}
+    if not os.path.exists(rcFile):
+        return rcs
+    with open(rcFile) as F:
+        for line in F:
+            try:
+                no, rc = [int(x) for x in line.split()]
+            except ValueError:
+                continue
+            rcs[no] = rc
+    return rcs
+
+
+def _merge(lists):
+    rv = []
+    seen = set()
+    for files in lists:
+        for f in files:
+            if not f in seen:
+                seen.add(f)
+                rv.append(f)
+    return rv
+
+
+def batches(items, size, needsRun, tmpDir, logDir):
+    """
+    Group the out-of-date items (as yielded for ruffus) into batches
+    of (at most) `size` items - yields batch items in the same form
+
+    :param needsRun: function deciding if an item needs to run
+    :param tmpDir: directory for the rc files
+    :param logDir: directory for the items' log files
+    """
+    if not os.path.exists(logDir):
+        os.makedirs(logDir)
+
+    def _batch(batch, batchNo):
+        rcFile = os.path.join(tmpDir, 'moa.batch.%d.%d.rc' % (
+            os.getpid(), batchNo))
+        if os.path.exists(rcFile):
+            os.unlink(rcFile)
+        info = {'rcFile': rcFile,
+                'logDir': logDir,
+                'batch': [(no, item[4].get('journal'),
+                           item[4].get('manifest'))
+                          for no, item in batch]}
+        batchScript = script(
+            [(no, item[2], getattr(item[3], 'overlay', {}))
+             for no, item in batch], rcFile, logDir, batch[0][1][3]['wd'])
+        l.debug("running a batch of %d items" % len(batch))
+        return (_merge([item[0] for no, item in batch]),
+                _merge([item[1] for no, item in batch]),
+                batchScript, batch[0][1][3], info)
+
+    batch = []
+    batchNo = 0
+    for no, item in enumerate(items):
+        if not needsRun(item):
+            continue
+        if not canBatch(item[2]):
+            yield item
+            continue
+        batch.append((no, item))
+        if len(batch) >= size:
+            batchNo += 1
+            yield _batch(batch, batchNo)
+            batch = []
+    if batch:
+        batchNo += 1
+        yield _batch(batch, batchNo)
@@ -1,10 +1,10 @@
 import os
 import re
 import glob
-import copy
 
 import Yaco
 import jinja2
+import jinja2.meta
 
 import moa.ui
 import moa.utils
@@ -25,6 +25,8 @@ class RuffCommands(Yaco.Yaco):
         
         self._confDir = confDir
         self._moaid = moaid
+        #: compiled command scripts: command -> (template, uses __moadata__)
+        self._compiled = {}
         self.load()
         
     def load(self):
@@ -90,8 +92,40 @@ class RuffCommands(Yaco.Yaco):
                 'ext' : cext,
                 'args' : cargs}
                     
-    def  render(self, command, data):
+    def compile(self, command):
+        """
+        Compile the script of a command (once) - returns the jinja
+        template & whether it refers to `__moadata__`
+        """
+        if command in self._compiled:
+            return self._compiled[command]
+
+        script = self[command].get('script', '')
+        jinjaEnv = moa.moajinja.getEnv()
+        ast = jinjaEnv.parse(script)
+        usesMoadata = '__moadata__' in \
+            jinja2.meta.find_undeclared_variables(ast)
+        compiled = (jinjaEnv.from_string(script), usesMoadata)
+        self._compiled[command] = compiled
+        return compiled
 
+    def  render(self, command, data):
+        """
+        Render the script of a command - values that expand to jinja
+        code are rendered in a second pass (with the same data)
+
+        >>> import tempfile
+        >>> confDir = tempfile.mkdtemp()
+        >>> os.mkdir(os.path.join(confDir, 'template.d'))
+        >>> with open(os.path.join(confDir, 'template.d', 't.jinja2'),
+        ...           'w') as F:
+        ...     F.write("### run\\n#!/bin/bash\\n{{ process }}\\n")
+        >>> commands = RuffCommands(confDir, 't')
+        >>> data = {'process': 'echo {{ __moadata__.a }}', 'a': 'x'}
+        >>> print commands.render('run', data).strip()
+        #!/bin/bash
+        echo x
+        """
         if not self.has_key(command):
             return ""
 
@@ -106,22 +140,26 @@ class RuffCommands(Yaco.Yaco):
         if "##moa:noxpand" in script:
             return script
 
-        jinjaEnv = moa.moajinja.getEnv()
-        jt = jinjaEnv.from_string(script)
+        jt, usesMoadata = self.compile(command)
 
         #trick - for introspection
-        data['__moadata__'] = copy.copy(data)
+        extra = {}
+        if usesMoadata:
+            extra['__moadata__'] = data
+
         try:
-            rscript = jt.render(data)
+            rscript = jt.render(data, **extra)
         except jinja2.exceptions.UndefinedError:
             l.debug("script")
             l.debug(script)
             raise
             moa.ui.exitError("Error jinja rendering command") 
 
-        if '{{' or '{%' in rscript:
-            #try a second level jinja interpretation
+        if '{{' in rscript or '{%' in rscript:
+            #try a second level jinja interpretation - the expanded
+            #values might refer to __moadata__ as well
+            jinjaEnv = moa.moajinja.getEnv()
             jt2 = jinjaEnv.from_string(rscript)
-            rscript = jt2.render(data)
+            rscript = jt2.render(data, __moadata__=data)
 
         return rscript
@@ -4,10 +4,13 @@ import tempfile
 import ruffus 
 
 import moa.actor
+import moa.backend.ruff.batch
+import moa.backend.ruff.journal
+import moa.backend.ruff.uptodate
 
 from moa.sysConf import sysConf
 
-def ruffusExecutor(input, output, script, jobData):
+def ruffusExecutor(input, output, script, jobData, info=None):
 
     if not sysConf.actor.has_key('files_processed'):
         sysConf.actor.files_processed = []
@@ -29,19 +32,60 @@ def ruffusExecutor(input, output, script, jobData):
     tf.close()
     os.chmod(tf.name, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
 
-    for k in jobData:
-        v = jobData[k]
-        if isinstance(v, list):
-            os.putenv(k, " ".join(v))
-        elif isinstance(v, dict):
-            continue
-        else:
-            os.putenv(k, str(v))
+    #the runner puts the job data in the environment of the task
 
     runner = moa.actor.getRunner()
     #print runner.category
+
+    #only track items that are executed here & now
+    if info is None or getattr(runner, 'category', 'sync') != 'sync':
+        info = {}
+
+    if info.get('batch') is not None:
+        return _runBatch(runner, tf.name, jobData, info)
+
+    journal = info.get('journal')
+    if journal is not None:
+        moa.backend.ruff.journal.start(*journal)
     rc = runner(jobData['wd'],  [tf.name], jobData, command=jobData['command'])
+    if journal is not None:
+        moa.backend.ruff.journal.finish(*(journal + (rc, wd)))
     if rc != 0:
         raise ruffus.JobSignalledBreak
+    if info.get('manifest') is not None:
+        #content based up-to-date checking - record the success
+        moa.backend.ruff.uptodate.record(*info['manifest'])
     #l.debug("Executing %s" % tf.name)
     
+
+
+def _runBatch(runner, scriptFile, jobData, info):
+    """
+    Run a batch of items - journal & record each item by itself
+    """
+    wd = jobData['wd']
+    for no, journal, manifest in info['batch']:
+        if journal is not None:
+            moa.backend.ruff.journal.start(*journal)
+
+    rc = runner(wd, [scriptFile], jobData, command=jobData['command'])
+
+    rcs = moa.backend.ruff.batch.readRcs(info['rcFile'])
+    if os.path.exists(info['rcFile']):
+        os.unlink(info['rcFile'])
+    moa.backend.ruff.batch.cleanLogs(
+        info['logDir'], [x[0] for x in info['batch']])
+    for no, journal, manifest in info['batch']:
+        itemRc = rcs.get(no)
+        if itemRc is None:
+            #did not finish
+            rc = rc or 1
+            continue
+        if journal is not None:
+            moa.backend.ruff.journal.finish(*(journal + (itemRc, wd)))
+        if itemRc != 0:
+            rc = rc or itemRc
+        elif manifest is not None:
+            moa.backend.ruff.uptodate.record(*manifest)
+    if rc != 0:
+        raise ruffus.JobSignalledBreak
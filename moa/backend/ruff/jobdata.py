@@ -0,0 +1,118 @@
+"""
+Ruff
+----
+
+Job data of the items of a map job.
+
+All items of a map job share the bulk of their data (the rendered
+configuration & all filesets); only a few values (the item's files,
+runid) differ per item. Each item is represented by a small
+:class:`ItemData` overlay over one, shared, :class:`SharedData`
+base. Pickling an item (i.e. sending it to a ruffus worker process)
+only pickles the overlay & a token identifying the base. The base is
+stored once, in a file, from which a worker process loads it (once)
+if it does not already have it (forked workers inherit it).
+
+>>> base = SharedData({'a': 1, 'files': range(1000)})
+>>> item = ItemData(base, {'files': 7, 'runid': 'rx.moa'})
+>>> item['a'], item['files'], item.get('runid'), item.get('b', 2)
+(1, 7, 'rx.moa', 2)
+>>> sorted(item.keys())
+['a', 'files', 'runid']
+>>> import cPickle
+>>> len(cPickle.dumps(item, 2)) < 200
+True
+>>> cPickle.loads(cPickle.dumps(item, 2))['a']
+1
+"""
+
+import os
+import hashlib
+import cPickle
+import collections
+
+import moa.utils
+
+#: shared data known to this process: token -> SharedData
+_SHARED = {}
+
+
+class SharedData(object):
+    """
+    Data shared by all items of a map job - do not change after
+    creating the :class:`ItemData` objects
+    """
+    def __init__(self, data):
+        self.data = data
+        self.blob = cPickle.dumps(data, cPickle.HIGHEST_PROTOCOL)
+        self.token = hashlib.md5(self.blob).hexdigest()
+        self.fileName = None
+        _SHARED[self.token] = self
+
+    def save(self, tmpDir):
+        """
+        Store the data for worker processes that do not inherit it
+        """
+        self.fileName = os.path.join(
+            tmpDir, 'shared.%s.pickle' % self.token)
+        moa.utils.atomicWrite(self.fileName, self.blob)
+
+    def remove(self):
+        """
+        Remove the stored data
+        """
+        if self.fileName and os.path.exists(self.fileName):
+            os.unlink(self.fileName)
+        self.fileName = None
+
+
+def _getShared(token, fileName):
+    """
+    Return the shared data identified by `token` - load it from
+    `fileName` if this process does not know it yet
+    """
+    if token in _SHARED:
+        return _SHARED[token]
+    with open(fileName, 'rb') as F:
+        shared = SharedData(cPickle.load(F))
+    shared.fileName = fileName
+    _SHARED[token] = shared
+    return shared
+
+
+def _loadItem(token, fileName, overlay):
+    return ItemData(_getShared(token, fileName), overlay)
+
+
+class ItemData(collections.Mapping):
+    """
+    The data of a single item - a small overlay over the shared data
+    """
+    def __init__(self, shared, overlay):
+        self.shared = shared
+        self.overlay = overlay
+
+    def __getitem__(self, key):
+        if key in self.overlay:
+            return self.overlay[key]
+        return self.shared.data[key]
+
+    def __contains__(self, key):
+        return key in self.overlay or key in self.shared.data
+
+    has_key = __contains__
+
+    def __iter__(self):
+        for k in self.shared.data:
+            if not k in self.overlay:
+                yield k
+        for k in self.overlay:
+            yield k
+
+    def __len__(self):
+        return len(self.shared.data) + \
+            len([k for k in self.overlay if not k in self.shared.data])
+
+    def __reduce__(self):
+        return (_loadItem,
+                (self.shared.token, self.shared.fileName, self.overlay))
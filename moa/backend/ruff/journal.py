@@ -0,0 +1,199 @@
+"""
+Ruff
+----
+
+Completion journal of map runs - allows resuming an interrupted run.
+
+Each map run appends an event for every item it starts & finishes
+(with the item's output files, the return code & the sizes of the
+output files) to
+`.moa/log.d/<runId>/journal`. Every event is a single line of JSON,
+written with a single (appending) write, so worker processes can
+write concurrently & an interrupted run leaves a readable journal.
+
+`moa run --resume` loads the journal of the last run of the same
+command: items that finished successfully (and of which the output
+files still have the recorded sizes) are skipped, output files of
+items that started but never finished are removed. Items are
+identified by their key (see :func:`moa.backend.ruff.uptodate.itemKey`).
+
+>>> import tempfile
+>>> confDir = tempfile.mkdtemp()
+>>> wd = os.path.dirname(confDir)
+>>> j = Journal(confDir, 1, 'run')
+>>> start(j.fileName, 'out.1', ['out.1'])
+>>> finish(j.fileName, 'out.1', ['out.1'], 0, wd)
+>>> start(j.fileName, 'out.2', ['out.2'])
+>>> command, events = load(j.fileName)
+>>> command, events['out.1']['event'], events['out.2']['event']
+(u'run', u'finish', u'start')
+"""
+
+import os
+import json
+import time
+
+import moa.logger
+
+l = moa.logger.getLogger(__name__)
+
+#: name of the journal file in the log dir of a run
+JOURNAL = 'journal'
+
+
+def _append(fileName, data):
+    """
+    Append an event to the journal - in a single write
+    """
+    line = json.dumps(data) + "\n"
+    fd = os.open(fileName, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def _sizes(outputs, wd):
+    """
+    Return the sizes of the output files of an item (None for a
+    missing file)
+    """
+    rv = {}
+    for fileName in outputs:
+        try:
+            rv[fileName] = os.path.getsize(os.path.join(wd, fileName))
+        except OSError:
+            rv[fileName] = None
+    return rv
+
+
+def start(fileName, key, outputs):
+    """
+    Record the start of an item
+    """
+    _append(fileName, {'event': 'start', 'key': key, 'outputs': outputs,
+                       'time': time.time()})
+
+
+def finish(fileName, key, outputs, rc, wd):
+    """
+    Record that an item finished
+    """
+    _append(fileName, {'event': 'finish', 'key': key, 'outputs': outputs,
+                       'rc': rc, 'sizes': _sizes(outputs, wd),
+                       'time': time.time()})
+
+
+def load(fileName):
+    """
+    Load a journal - returns the command & a dict with the last event
+    of each item
+    """
+    command = None
+    events = {}
+    with open(fileName) as F:
+        for line in F:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                #incomplete line - interrupted while writing
+                continue
+            if event.get('event') == 'run':
+                command = event.get('command')
+            elif 'key' in event:
+                events[event['key']] = event
+    return command, events
+
+
+class Journal(object):
+    """
+    Journal of the current run
+
+    :param confDir: the job's `.moa` directory
+    :param runId: id of the current run
+    :param command: command being run
+    """
+    def __init__(self, confDir, runId, command):
+        self.confDir = confDir
+        self.runId = runId
+        self.command = command
+        logDir = os.path.join(confDir, 'log.d', '%d' % runId)
+        if not os.path.exists(logDir):
+            os.makedirs(logDir)
+        self.fileName = os.path.join(logDir, JOURNAL)
+        _append(self.fileName, {'event': 'run', 'command': command,
+                                'time': time.time()})
+
+    def previous(self):
+        """
+        Return the events of the last earlier run of the same
+        command - or None
+        """
+        logDir = os.path.join(self.confDir, 'log.d')
+        runIds = sorted([int(x) for x in os.listdir(logDir)
+                         if x.isdigit() and int(x) < self.runId],
+                        reverse=True)
+        for runId in runIds:
+            fileName = os.path.join(logDir, '%d' % runId, JOURNAL)
+            if not os.path.exists(fileName):
+                continue
+            command, events = load(fileName)
+            if command == self.command:
+                l.debug("resuming from run %d" % runId)
+                return events
+        return None
+
+    def resume(self, wd, inputs=()):
+        """
+        Prepare to resume the last run of this command - returns the
+        set of items that completed. Removes the output files of items
+        that started but did not finish (but never directories or
+        input files) & carries the completed items over to this run's
+        journal (so this run can be resumed in turn)
+
+        :param inputs: the input (& prerequisite) files of the job
+
+        >>> import tempfile
+        >>> wd = tempfile.mkdtemp()
+        >>> confDir = os.path.join(wd, '.moa')
+        >>> j = Journal(confDir, 1, 'run')
+        >>> for name in ['in', 'out']:
+        ...     open(os.path.join(wd, name), 'w').close()
+        >>> os.mkdir(os.path.join(wd, 'outdir'))
+        >>> start(j.fileName, 'x', ['in', 'out', 'outdir'])
+        >>> Journal(confDir, 2, 'run').resume(wd, ['in'])
+        set([])
+        >>> sorted(os.listdir(wd))
+        ['.moa', 'in', 'outdir']
+        """
+        events = self.previous()
+        if events is None:
+            return set()
+
+        realInputs = set([os.path.realpath(os.path.join(wd, x))
+                          for x in inputs])
+
+        done = set()
+        carried = []
+        for key, event in events.iteritems():
+            outputs = event.get('outputs', [])
+            if event['event'] == 'start':
+                for fileName in outputs:
+                    path = os.path.join(wd, fileName)
+                    if not os.path.isfile(path) or \
+                            os.path.realpath(path) in realInputs:
+                        continue
+                    l.debug("removing partial output %s" % path)
+                    try:
+                        os.unlink(path)
+                    except OSError, e:
+                        l.warning("cannot remove %s: %s" % (path, e))
+            elif event['event'] == 'finish' and event.get('rc') == 0 \
+                    and _sizes(outputs, wd) == event.get('sizes'):
+                done.add(key)
+                carried.append(json.dumps(event) + "\n")
+
+        if carried:
+            with open(self.fileName, 'a') as F:
+                F.write("".join(carried))
+        return done
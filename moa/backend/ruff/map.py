@@ -9,9 +9,9 @@ import os
 import re
 import sys
 import stat
-import copy
 import glob
 import random
+import itertools
 import tempfile
 import subprocess
 
@@ -30,77 +30,149 @@ from moa.sysConf import sysConf
 from moa.backend.ruff.commands import RuffCommands
 from moa.backend.ruff.base import RuffBaseJob
 from moa.backend.ruff.executor import ruffusExecutor
+from moa.backend.ruff.jobdata import SharedData, ItemData
+from moa.backend.ruff.journal import Journal
+from moa.backend.ruff.uptodate import itemKey
+from moa.backend.ruff import batch
+from moa.backend.ruff import native
 
 class RuffMapJob(RuffBaseJob):    
 
-    def execute(self):
+    def items(self):
+        """
+        Generator for a map operation -
 
-        def generate_data_map():
-            """
-            Generator for a map operation -
+        this function generates each pair of in & output files
+        that constitute a single job: (inputs, prerequisites,
+        outputs, item data) tuples
+        """
 
-            this function generates each pair of in & output files
-            that constitute a single job.
-            """
+        ## What files are prerequisites?
+        prereqs = []
+        for fsid in self.job.data.prerequisites:
+            prereqs.extend(self.job.data.filesets[fsid]['files'])
+            
+              
+        # What files are 'others' - 
+        # i.e. those that are necessary, but do not force a rebuild
+        # if updated - currently ignoring these - should probably 
+        # look at this.
 
-            ## What files are prerequisites?
-            prereqs = []
-            for fsid in self.job.data.prerequisites:
-                prereqs.extend(self.job.data.filesets[fsid]['files'])
+        others = []
+        for fsid in self.job.data.others:
+            others.extend(self.job.data.filesets[fsid]['files'])
                 
-                  
-            # What files are 'others' - 
-            # i.e. those that are necessary, but do not force a rebuild
-            # if updated - currently ignoring these - should probably 
-            # look at this.
-
-            others = []
-            for fsid in self.job.data.others:
-                others.extend(self.job.data.filesets[fsid]['files'])
-                    
 
-            # determine number the number of files - make sure that each
-            # job has the same number of in & output files
+        # determine number the number of files - make sure that each
+        # job has the same number of in & output files
 
-            noFiles = 0
-            in_out_files = self.job.data.outputs + self.job.data.inputs
-            for i, k in enumerate(in_out_files):
-                if i == 0:
-                    noFiles = len(self.job.data.filesets[k].files)
-                else:
-                    assert(len(self.job.data.filesets[k].files) == noFiles)
+        noFiles = 0
+        in_out_files = self.job.data.outputs + self.job.data.inputs
+        for i, k in enumerate(in_out_files):
+            if i == 0:
+                noFiles = len(self.job.data.filesets[k].files)
+            else:
+                assert(len(self.job.data.filesets[k].files) == noFiles)
 
-            # rearrange the files for yielding
-                    
-            for i in range(noFiles):
-                outputs = [self.job.data.filesets[x].files[i] 
-                           for x in self.job.data.outputs]
-                inputs =  [self.job.data.filesets[x].files[i] 
-                           for x in self.job.data.inputs]
+        # rearrange the files for yielding - walk through all filesets
+        # in parallel (without looking them up for each item)
+
+        inputIds = list(self.job.data.inputs)
+        outputIds = list(self.job.data.outputs)
+        noInputs = len(inputIds)
+        fsids = inputIds + outputIds
+        fileLists = [self.job.data.filesets[x].files for x in fsids]
+        baseRunid = self.jobData.get('runid', "moa")
+
+        for files in itertools.izip(*fileLists):
+            files = list(files)
+            inputs = files[:noInputs]
+            outputs = files[noInputs:]
+
+            fsDict = dict(zip(fsids, files))
+            
+            thisJobData = fsDict
+            runid = baseRunid
+
+            if inputIds:
+                ffn =  os.path.basename(inputs[0])
+                runid = ffn + '.' + runid
+
+            runid = 'r' + runid
+            thisJobData['runid'] = runid
+            thisJobData['command'] = 'run'
+
+            yield inputs, prereqs, outputs, thisJobData
+
+    def execute(self):
+
+        # all items share one copy of the job data - each item only
+        # carries its own files & runid
+        shared = SharedData(self.jobData)
+
+        check = self.getHashCheck(
+            [f for fsid in self.job.data.inputs + self.job.data.prerequisites
+             for f in self.job.data.filesets[fsid].files])
+
+        # record the progress of this run - & skip what was done by
+        # the last run if resuming
+        journal = Journal(self.job.confDir, sysConf.runId, self.command)
+        done = set()
+        if getattr(self.args, 'resume', False):
+            done = journal.resume(
+                self.job.wd,
+                [f for fsid in self.job.data.inputs +
+                 self.job.data.prerequisites
+                 for f in self.job.data.filesets[fsid].files])
+
+        def generate_data_map():
+            """
+            Generator for ruffus: the items of this job that still
+            need to be considered
+            """
+            for inputs, prereqs, outputs, thisJobData in self.items():
+                key = itemKey(inputs + prereqs, outputs)
+                if key in done:
+                    continue
                 
                 l.debug('pushing job with inputs %s' % ", ".join(inputs[:10]))
                     
-                fsDict = dict([(x, self.job.data.filesets[x]['files'][i])
-                               for x in self.job.data.inputs + self.job.data.outputs])
-                
-                thisJobData = copy.copy(self.jobData)
-                thisJobData.update(fsDict)                
-                thisJobData['command'] = 'run'
-                runid = thisJobData.get('runid', "moa")
-
-                if self.job.data.inputs:
-                    fips =  self.job.data.inputs[0]
-                    ffn =  os.path.basename(fsDict[fips])
-                    runid = ffn + '.' + runid
-
-                runid = 'r' + runid
-                thisJobData['runid'] = runid
-                thisJobData['command'] = 'run'
+                thisJobData = ItemData(shared, thisJobData)
 
                 script = self.commands.render('run', thisJobData)
                 l.debug("Executing %s" %  script)
 
-                yield(inputs + prereqs, outputs, script, thisJobData)
+                info = {'journal': (journal.fileName, key, outputs)}
+                if check is not None:
+                    info['manifest'] = check.entry(
+                        inputs + prereqs, outputs, script)
+
+                yield(inputs + prereqs, outputs, script, thisJobData, info)
+
+        batchSize = self.getBatchSize()
+
+        def needsRun(item):
+            if check is not None:
+                return check(*item)[0]
+            return native.needsUpdate(item[0], item[1])[0]
+
+        def generate_items():
+            """
+            Generator for the executor: the items of this job or, if
+            running in batches, the batches of out of date items
+            """
+            if batchSize == 1:
+                items = generate_data_map()
+            else:
+                tmpDir = os.path.join(self.job.wd, '.moa', 'tmp')
+                if not os.path.exists(tmpDir):
+                    os.makedirs(tmpDir)
+                logDir = os.path.join(os.path.dirname(journal.fileName),
+                                      'items')
+                items = batch.batches(generate_data_map(), batchSize,
+                                      needsRun, tmpDir, logDir)
+            for item in items:
+                yield item
 
 
 
@@ -115,14 +187,31 @@ class RuffMapJob(RuffBaseJob):
         if len(self.job.data.inputs) + len(self.job.data.outputs) == 0:
             moa.ui.exitError("no in or output files")
 
+        if self.getExecutor() == 'native':
+            if self.args.threads > 1:
+                shared.save(os.path.join(self.job.wd, '.moa', 'tmp'))
+            try:
+                return self.runNative(generate_items(), check)
+            finally:
+                shared.remove()
+                if check is not None:
+                    check.finish()
+
 
         #here we're telling ruffus to proceed using the in & output files
         #we're generating
         l.debug("decorating executor")
-        executor2 = ruffus.files(generate_data_map)(ruffusExecutor)
+        executor2 = ruffus.files(generate_items)(ruffusExecutor)
+        if check is not None:
+            ruffus.check_if_uptodate(check)(ruffusExecutor)
         l.debug("Start run (with %d thread(s))" %
                 self.args.threads)
             
+        if self.args.threads > 1:
+            #worker processes that do not inherit the shared data
+            #load it from here
+            shared.save(os.path.join(self.job.wd, '.moa', 'tmp'))
+
         try:
             #Run!
             ruffus.pipeline_run(
@@ -155,6 +244,10 @@ class RuffMapJob(RuffBaseJob):
             except:
                 pass
             moa.ui.exitError("Quitting")
+        finally:
+            shared.remove()
+            if check is not None:
+                check.finish()
 
 
         #empty the ruffus node name cache needs to be empty -
@@ -0,0 +1,219 @@
+"""
+Ruff
+----
+
+Native executor for map & reduce jobs - an alternative to running
+them through ruffus.
+
+Items are taken from the (lazy) item generator of a job & scheduled
+on a bounded pool of worker processes as they are generated: at most
+`BACKLOG` items per worker are queued, generation waits for a free
+slot. Each item is sent to the workers by itself (with the job data
+shared by all items stored once, see
+:mod:`moa.backend.ruff.jobdata`). After the first failure no more
+items are scheduled, the items already running are allowed to finish.
+
+Items are considered up to date using the same rules as ruffus'
+timestamp check (or using a content based checker, see
+:mod:`moa.backend.ruff.uptodate`).
+
+>>> import tempfile
+>>> d = tempfile.mkdtemp()
+>>> a, b = os.path.join(d, 'a'), os.path.join(d, 'b')
+>>> open(a, 'w').close()
+>>> needsUpdate([a], [b]) == (True, 'Missing file %s' % b)
+True
+>>> open(b, 'w').close()
+>>> os.utime(a, (1000000000, 1000000000))
+>>> needsUpdate([a], [b])
+(False, 'Up to date')
+>>> os.utime(b, (1000000000, 1000000000))
+>>> needsUpdate([a], [b])
+(True, 'Input files newer than output files')
+"""
+
+import os
+import threading
+import traceback
+import multiprocessing
+
+import ruffus
+
+import moa.logger
+
+from moa.backend.ruff.executor import ruffusExecutor
+from moa.backend.ruff.uptodate import _flatten, itemKey
+
+l = moa.logger.getLogger(__name__)
+
+#: available executors for map & reduce jobs
+EXECUTORS = ['ruffus', 'native']
+
+#: no items queued per worker process
+BACKLOG = 2
+
+#: item states
+SKIPPED = 'up to date'
+QUEUED = 'queued'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def _mtime(fileName):
+    try:
+        return os.path.getmtime(fileName)
+    except OSError:
+        return None
+
+
+def needsUpdate(inputs, outputs, mtime=_mtime):
+    """
+    Decide if an item needs to run based on file timestamps - the
+    rules of ruffus' (classic) file timestamp check: run if any file
+    is missing or if an input file is not older than the oldest
+    output file. Returns (needs update, reason)
+
+    :param mtime: function returning the mtime of a file (None if it
+      does not exist)
+    """
+    inputs = _flatten(inputs)
+    outputs = _flatten(outputs)
+    if not outputs:
+        return True, "Missing output file"
+    inTimes = [mtime(x) for x in inputs]
+    outTimes = [mtime(x) for x in outputs]
+    for fileName, t in zip(inputs + outputs, inTimes + outTimes):
+        if t is None:
+            return True, "Missing file %s" % fileName
+    if not inputs:
+        return False, "Missing input files"
+
+    newest = max(inTimes)
+    if newest >= min(outTimes):
+        #ignore outputs that are (links to) inputs
+        realInputs = set([os.path.realpath(x) for x in inputs])
+        outTimes = [t for x, t in zip(outputs, outTimes)
+                    if not os.path.realpath(x) in realInputs]
+        if outTimes and newest >= min(outTimes):
+            return True, "Input files newer than output files"
+    return False, "Up to date"
+
+
+def _runItem(function, item):
+    """
+    Run a single item - possibly in a worker process. Returns
+    (success, error message) - never raises, the scheduler depends on
+    hearing back
+    """
+    try:
+        function(*item)
+    except ruffus.JobSignalledBreak:
+        return False, "Non zero return code"
+    except Exception:
+        return False, traceback.format_exc()
+    return True, None
+
+
+class NativeExecutor(object):
+    """
+    Run the items of a job on a bounded pool of processes
+
+    :param threads: number of worker processes (run in this process
+      if 1)
+    :param check: up-to-date checker with the signature of a ruffus
+      `check_if_uptodate` function - if None, use timestamps
+    :param function: function executing an item (a module level
+      function - it is pickled), defaults to the ruffus executor
+    """
+    def __init__(self, threads=1, check=None, function=None):
+        self.threads = max(1, threads)
+        self.check = check
+        self.function = function or ruffusExecutor
+        #state of each item, by item key
+        self.states = {}
+        #(item key, error message) of the items that failed
+        self.failed = []
+        self.lock = threading.Lock()
+
+    def key(self, item):
+        return itemKey(item[0], item[1])
+
+    def schedule(self, item):
+        """
+        Decide what to do with an item - returns its new state:
+        SKIPPED if up to date, QUEUED if it needs to run or FAILED if
+        it cannot run
+        """
+        key = self.key(item)
+        inputs, outputs = item[:2]
+        if self.check is not None:
+            needed, reason = self.check(*item)
+        else:
+            needed, reason = needsUpdate(inputs, outputs)
+        if not needed:
+            l.debug("skipping %s: %s" % (key, reason))
+            self.states[key] = SKIPPED
+            return SKIPPED
+        if self.check is None:
+            #like ruffus, refuse to run an item with missing input
+            for fileName in _flatten(inputs):
+                if not os.path.exists(fileName):
+                    self._finished(key, (False, "Input file '%s' does "
+                                         "not exist" % fileName))
+                    return FAILED
+        self.states[key] = QUEUED
+        return QUEUED
+
+    def _finished(self, key, result):
+        ok, message = result
+        with self.lock:
+            if ok:
+                self.states[key] = DONE
+            else:
+                self.states[key] = FAILED
+                self.failed.append((key, message))
+
+    def run(self, items):
+        """
+        Run all items that are not up to date - returns the list of
+        (key, error message) of failed items
+        """
+        if self.threads == 1:
+            for item in items:
+                state = self.schedule(item)
+                if state == QUEUED:
+                    self._finished(self.key(item),
+                                   _runItem(self.function, item))
+                if self.failed:
+                    break
+            return self.failed
+
+        slots = threading.Semaphore(self.threads * BACKLOG)
+        pool = multiprocessing.Pool(self.threads)
+
+        def callback(key):
+            def _callback(result):
+                self._finished(key, result)
+                slots.release()
+            return _callback
+
+        try:
+            for item in items:
+                #wait for a free slot
+                slots.acquire()
+                state = FAILED
+                if not self.failed:
+                    state = self.schedule(item)
+                if state != QUEUED:
+                    slots.release()
+                    if state == SKIPPED:
+                        continue
+                    break
+                pool.apply_async(_runItem, (self.function, item),
+                                 callback=callback(self.key(item)))
+            pool.close()
+            pool.join()
+        except:
+            pool.terminate()
+            raise
+        return self.failed
@@ -0,0 +1,222 @@
+"""
+Ruff
+----
+
+Out-of-date analysis of map & reduce commands (see `moa plan`):
+determine, without executing anything, which items of a command
+would run & why.
+
+All files involved are stat-ed once (prerequisites are shared by all
+items of a map job), in chunks, by a pool of threads.
+
+>>> import tempfile
+>>> d = tempfile.mkdtemp()
+>>> open(os.path.join(d, 'a'), 'w').close()
+>>> stats = statAll(['a', 'b'], d)
+>>> stats['a'][1], stats['b']
+(0, None)
+"""
+
+import os
+import glob
+import multiprocessing.pool
+
+import moa.ui
+import moa.logger
+from moa.sysConf import sysConf
+
+from moa.backend.ruff import native
+from moa.backend.ruff import uptodate
+from moa.backend.ruff.map import RuffMapJob
+from moa.backend.ruff.reduce import RuffReduceJob
+from moa.backend.ruff.jobdata import SharedData, ItemData
+
+l = moa.logger.getLogger(__name__)
+
+#: number of threads used to stat files
+THREADS = 8
+
+#: number of files stat-ed per thread at once
+CHUNK = 2000
+
+#: item states
+UPTODATE = 'up to date'
+MISSINGINPUT = 'missing input'
+MISSINGOUTPUT = 'missing output'
+OLDERTHANINPUT = 'older than input'
+OLDERTHANPREREQ = 'older than prerequisite'
+INPUTCHANGED = 'input changed'
+SCRIPTCHANGED = 'script changed'
+
+#: states of items that `moa run` executes (per up-to-date mode);
+#: timestamp based checking does not notice a changed script
+RUNS = {
+    'mtime': [MISSINGINPUT, MISSINGOUTPUT, OLDERTHANINPUT,
+              OLDERTHANPREREQ],
+    'hash': [MISSINGINPUT, MISSINGOUTPUT, INPUTCHANGED, SCRIPTCHANGED],
+}
+
+
+def _statChunk(paths):
+    rv = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            rv.append((st.st_mtime, st.st_size))
+        except OSError:
+            rv.append(None)
+    return rv
+
+
+def statAll(fileNames, wd='.', threads=THREADS):
+    """
+    Stat all files (relative to `wd`) - returns a dict: file name ->
+    (mtime, size), or None for a missing file
+    """
+    fileNames = list(fileNames)
+    chunks = [[os.path.join(wd, x) for x in fileNames[i:i + CHUNK]]
+              for i in range(0, len(fileNames), CHUNK)]
+    if threads > 1 and len(chunks) > 1:
+        pool = multiprocessing.pool.ThreadPool(threads)
+        try:
+            results = pool.map(_statChunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_statChunk(x) for x in chunks]
+
+    rv = {}
+    for i, result in enumerate(results):
+        rv.update(zip(fileNames[i * CHUNK:(i + 1) * CHUNK], result))
+    return rv
+
+
+def _scriptTime(job):
+    """
+    Last time the script of the job could have changed: the mtime of
+    the job configuration or the template's command files
+    """
+    files = [os.path.join(job.confDir, 'config')] + glob.glob(
+        os.path.join(job.confDir, 'template.d',
+                     '%s.*' % job.template.moa_id))
+    mtimes = [os.path.getmtime(x) for x in files if os.path.exists(x)]
+    if not mtimes:
+        return 0
+    return max(mtimes)
+
+
+def _mtimeState(inputs, prereqs, outputs, stats, scriptTime):
+    """
+    Determine the state of an item from the file timestamps - whether
+    it needs to run is decided like `moa run` does
+
+    >>> stats = {'a': (10, 0), 'b': (10, 0), 'c': (20, 0)}
+    >>> _mtimeState(['a'], [], ['b'], stats, 0)
+    'older than input'
+    >>> _mtimeState(['a'], [], ['c'], stats, 0)
+    'up to date'
+    """
+    def mtime(fileName):
+        st = stats[fileName]
+        return st and st[0]
+
+    needed, reason = native.needsUpdate(inputs + prereqs, outputs, mtime)
+    if needed:
+        if [x for x in inputs + prereqs if stats[x] is None]:
+            return MISSINGINPUT
+        if not outputs or [x for x in outputs if stats[x] is None]:
+            return MISSINGOUTPUT
+        oldest = min([stats[x][0] for x in outputs])
+        if inputs and max([stats[x][0] for x in inputs]) >= oldest:
+            return OLDERTHANINPUT
+        return OLDERTHANPREREQ
+    if outputs and scriptTime > min([stats[x][0] for x in outputs]):
+        return SCRIPTCHANGED
+    return UPTODATE
+
+
+def _hashState(entry, outputs, stats, check):
+    if entry is None:
+        return MISSINGINPUT
+    if None in [stats[x] for x in outputs]:
+        return MISSINGOUTPUT
+    manifestFile, key, digest, scriptDigest = entry
+    recorded = check.manifest.get(key)
+    if recorded and recorded[0] == digest:
+        return UPTODATE
+    if recorded and recorded[1] != scriptDigest:
+        return SCRIPTCHANGED
+    return INPUTCHANGED
+
+
+def plan(job, command, args):
+    """
+    Determine the state of each item of a map or reduce command -
+    returns a dict (ready for JSON serialization)
+    """
+    cinfo = job.template.commands.get(command)
+    if not cinfo:
+        moa.ui.exitError("Unknown command %s" % command)
+    cmode = cinfo.get('mode', 'simple')
+    if cmode == 'map':
+        rj = RuffMapJob(job, command, args)
+    elif cmode == 'reduce':
+        rj = RuffReduceJob(job, command, args)
+    else:
+        moa.ui.exitError("Can only plan map & reduce commands")
+
+    rj.prepareJobData()
+    mode = uptodate.getMode(args)
+    items = list(rj.items())
+
+    #collect & stat all files
+    fileNames = set()
+    seen = set()
+    for inputs, prereqs, outputs, itemData in items:
+        fileNames.update(inputs)
+        fileNames.update(outputs)
+        if not id(prereqs) in seen:
+            # the prerequisites list is shared by all items
+            seen.add(id(prereqs))
+            fileNames.update(prereqs)
+    stats = statAll(fileNames, job.wd)
+
+    check = None
+    if mode == 'hash':
+        shared = SharedData(rj.jobData)
+        check = rj.getHashCheck(
+            [x for x in fileNames if stats[x] is not None])
+    else:
+        scriptTime = _scriptTime(job)
+
+    rv = {'command': command,
+          'mode': mode,
+          'items': [],
+          'summary': {}}
+    for inputs, prereqs, outputs, itemData in items:
+        if mode == 'hash':
+            script = rj.commands.render('run', ItemData(shared, itemData))
+            entry = check.entry(inputs + prereqs, outputs, script)
+            state = _hashState(entry, outputs, stats, check)
+        else:
+            state = _mtimeState(inputs, prereqs, outputs, stats, scriptTime)
+
+        inputBytes = sum([stats[x][1] for x in inputs
+                          if stats[x] is not None])
+        rv['items'].append({'inputs': inputs,
+                            'outputs': outputs,
+                            'state': state,
+                            'input_bytes': inputBytes})
+        summary = rv['summary'].setdefault(
+            state, {'items': 0, 'input_bytes': 0})
+        summary['items'] += 1
+        summary['input_bytes'] += inputBytes
+
+    if check is not None:
+        check.cache.save()
+
+    rv['total'] = len(items)
+    rv['to_run'] = sum([v['items'] for k, v in rv['summary'].items()
+                        if k in RUNS[mode]])
+    return rv
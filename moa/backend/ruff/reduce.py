@@ -33,8 +33,11 @@ from moa.backend.ruff.executor import ruffusExecutor
 
 class RuffReduceJob(RuffBaseJob):    
 
-    def execute(self):
-
+    def items(self):
+        """
+        Generate the (single) item of a reduce operation: an
+        (inputs, prerequisites, outputs, item data) tuple
+        """
 
         ## What files are prerequisites?
         prereqs = []
@@ -71,20 +74,42 @@ class RuffReduceJob(RuffBaseJob):
             [(x, self.job.data.filesets[x]['files'][0])
              for x in self.job.data.outputs])
 
-        thisJobData = copy.copy(self.jobData)
+        thisJobData = {}
         thisJobData.update(fsInDict)                
         thisJobData.update(fsOutDict)                
 
-        thisJobData['command'] = 'run'
-        runid = thisJobData.get('runid', "moa")
+        runid = self.jobData.get('runid', "moa")
 
         runid = 'r' + runid
         thisJobData['runid'] = runid
         thisJobData['command'] = 'run'
 
+        yield inputs, prereqs, outputs, thisJobData
+
+    def execute(self):
+
+        inputs, prereqs, outputs, itemData = self.items().next()
+
+        thisJobData = copy.copy(self.jobData)
+        thisJobData.update(itemData)
+
         script = self.commands.render('run', thisJobData)
         l.debug("Executing %s" %  script)
 
+        check = self.getHashCheck(inputs + prereqs)
+        info = {}
+        if check is not None:
+            info['manifest'] = check.entry(inputs + prereqs, outputs, script)
+
+
+        if self.getExecutor() == 'native':
+            try:
+                return self.runNative(
+                    [([inputs + prereqs], outputs, script,
+                      thisJobData, info)], check)
+            finally:
+                if check is not None:
+                    check.finish()
 
         if hasattr(ruffusExecutor, 'pipeline_task'):
             del ruffusExecutor.pipeline_task
@@ -93,8 +118,10 @@ class RuffReduceJob(RuffBaseJob):
         #we're generating
         l.debug("decorating executor")
         executor2 = ruffus.files(
-            [inputs + prereqs], outputs, script, thisJobData
+            [inputs + prereqs], outputs, script, thisJobData, info
             )(ruffusExecutor)
+        if check is not None:
+            ruffus.check_if_uptodate(check)(ruffusExecutor)
         l.debug("Start reduce run")
             
         try:
@@ -128,6 +155,9 @@ class RuffReduceJob(RuffBaseJob):
                 
                 pass
             moa.ui.exitError(error_message)
+        finally:
+            if check is not None:
+                check.finish()
                  
 
         #empty the ruffus node name cache needs to be empty -
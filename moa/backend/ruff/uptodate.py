@@ -0,0 +1,174 @@
+"""
+Ruff
+----
+
+Content based up-to-date checking for map & reduce jobs.
+
+By default, ruffus decides what to (re)run by comparing the
+timestamps of in- and output files. In `hash` mode (`moa run
+--uptodate hash`, or `uptodate: hash` in the configuration) an item
+is rerun if the digest of its input & prerequisite files plus its
+rendered script differs from the digest recorded (in
+`.moa/manifest.<command>`) after it last ran successfully, or if any
+of its output files is missing. File digests are cached in
+`.moa/hash.cache` (see :mod:`moa.digest`).
+"""
+
+import os
+import json
+import hashlib
+
+import moa.ui
+import moa.utils
+import moa.digest
+import moa.logger
+from moa.sysConf import sysConf
+
+l = moa.logger.getLogger(__name__)
+
+#: available up-to-date modes
+MODES = ['mtime', 'hash']
+
+
+def getMode(args):
+    """
+    Return the up-to-date mode for this run
+    """
+    mode = getattr(args, 'uptodate', None)
+    if not mode:
+        mode = sysConf.get('uptodate') or 'mtime'
+    if not mode in MODES:
+        moa.ui.exitError("Invalid up-to-date mode: %s" % mode)
+    return mode
+
+
+def _flatten(files):
+    rv = []
+    for f in files:
+        if isinstance(f, basestring):
+            rv.append(f)
+        else:
+            rv.extend(_flatten(f))
+    return rv
+
+
+def itemKey(inputs, outputs):
+    """
+    Return the key of an item in manifests & journals: its output
+    files - or its input files if it has no output files
+
+    >>> itemKey(['a.in'], [['a.out', 'a.log']])
+    'a.out\\ta.log'
+    >>> itemKey(['a.in', 'b.in'], [])
+    '<\\ta.in\\tb.in'
+    """
+    outputs = _flatten(outputs)
+    if outputs:
+        return "\t".join(outputs)
+    return "\t".join(['<'] + _flatten(inputs))
+
+
+def record(manifestFile, key, digest, scriptDigest=None):
+    """
+    Record that an item ran successfully - called from the executor,
+    possibly in a worker process, hence a single appended line
+    """
+    line = json.dumps([key, digest, scriptDigest]) + "\n"
+    fd = os.open(manifestFile, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                 0644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def loadManifest(manifestFile):
+    """
+    Load a manifest - returns a dict: key -> (digest, script digest)
+    & the number of lines read
+    """
+    manifest = {}
+    lines = 0
+    if not os.path.exists(manifestFile):
+        return manifest, lines
+    with open(manifestFile) as F:
+        for line in F:
+            lines += 1
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                #incomplete line
+                continue
+            scriptDigest = None
+            if len(entry) > 2:
+                scriptDigest = entry[2]
+            manifest[entry[0]] = (entry[1], scriptDigest)
+    return manifest, lines
+
+
+class HashCheck(object):
+    """
+    Ruffus up-to-date checker comparing content digests
+
+    :param wd: job directory
+    :param command: command being run
+    """
+    def __init__(self, wd, command):
+        self.wd = wd
+        confDir = os.path.join(wd, '.moa')
+        self.cache = moa.digest.HashCache(
+            os.path.join(confDir, 'hash.cache'))
+        self.manifestFile = os.path.join(
+            confDir, 'manifest.%s' % command)
+        self.manifest, lines = loadManifest(self.manifestFile)
+
+    def _path(self, fileName):
+        return os.path.join(self.wd, fileName)
+
+    def prepare(self, fileNames):
+        """
+        Hash all files that changed since they were last hashed - in
+        parallel
+        """
+        self.cache.update([self._path(x) for x in fileNames])
+
+    def entry(self, inputs, outputs, script):
+        """
+        Return the manifest entry for an item: (manifest file, key,
+        digest, script digest) - or None if an input file is missing
+        """
+        h = hashlib.sha1(script)
+        scriptDigest = h.hexdigest()
+        for fileName in _flatten(inputs):
+            digest = self.cache.digest(self._path(fileName))
+            if digest is None:
+                return None
+            h.update("\0%s\0%s" % (fileName, digest))
+        return (self.manifestFile, itemKey(inputs, outputs),
+                h.hexdigest(), scriptDigest)
+
+    def __call__(self, inputs, outputs, script, jobData, info=None):
+        if (info or {}).get('batch') is not None:
+            #the items of a batch are checked before batching
+            return True, "Batch of out of date items"
+        entry = (info or {}).get('manifest')
+        if entry is None:
+            return True, "Missing input files"
+        for fileName in _flatten(outputs):
+            if not os.path.exists(self._path(fileName)):
+                return True, "Missing output file %s" % fileName
+        manifestFile, key, digest, scriptDigest = entry
+        if self.manifest.get(key, (None, None))[0] != digest:
+            return True, "Input files or script changed"
+        return False, "Up to date"
+
+    def finish(self):
+        """
+        Store the digest cache & compact the manifest
+        """
+        self.cache.save()
+        manifest, lines = loadManifest(self.manifestFile)
+        if lines > 2 * len(manifest):
+            moa.utils.atomicWrite(self.manifestFile, "".join(
+                [json.dumps([k] + list(v)) + "\n"
+                 for k, v in manifest.items()]))
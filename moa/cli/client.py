@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+Thin client for the Moa server (see :mod:`moa.cli.server`)
+
+Forwards the command line, working directory & environment to a
+running `moad` and streams back stdout, stderr & the return code. If
+no server is running, the command is executed locally (which is as
+slow as running `moa`). The command line, working directory &
+environment are sent as bytes (see :func:`toWire`) - they need not be
+ASCII or even valid UTF-8.
+
+The client only connects to a socket owned by the user, in a
+directory owned by the user & inaccessible to others - the request
+contains the complete environment of the client.
+
+Keep this module light - it should not import any of the heavy parts
+of Moa (or anything that imports those).
+"""
+
+import fcntl
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+import termios
+
+#: frame header: channel (1 char) & payload length
+HEADER = struct.Struct('!cI')
+
+
+def socketPath():
+    """
+    Return the path of the (per user) server socket
+    """
+    if 'MOAD_SOCKET' in os.environ:
+        return os.environ['MOAD_SOCKET']
+    return os.path.join(os.environ.get('TMPDIR', '/tmp'),
+                        'moad-%d' % os.getuid(), 'socket')
+
+
+def isPrivate(path, isDir=False):
+    """
+    Check that a path is owned by the current user & not accessible
+    by others - and is a directory (if `isDir`) or a socket, not a
+    symlink to one
+    """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    if st.st_uid != os.getuid() or stat.S_IMODE(st.st_mode) & 077:
+        return False
+    if isDir:
+        return stat.S_ISDIR(st.st_mode)
+    return stat.S_ISSOCK(st.st_mode)
+
+
+def toWire(s):
+    """
+    Convert a byte string (i.e. an environment value, which need not
+    be valid UTF-8) to unicode that survives JSON unchanged
+    """
+    return s.decode('latin-1')
+
+
+def fromWire(u):
+    """
+    Convert a string encoded with :func:`toWire` back to bytes
+
+    >>> fromWire(toWire('caf\\xc3\\xa9 \\xff')) == 'caf\\xc3\\xa9 \\xff'
+    True
+    """
+    return u.encode('latin-1')
+
+
+def sendFrame(sock, channel, data):
+    sock.sendall(HEADER.pack(channel, len(data)) + data)
+
+
+def _recvExactly(sock, size):
+    rv = []
+    while size > 0:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            raise EOFError()
+        rv.append(chunk)
+        size -= len(chunk)
+    return "".join(rv)
+
+
+def recvFrame(sock):
+    """
+    Receive a frame - returns a (channel, data) tuple
+    """
+    channel, size = HEADER.unpack(_recvExactly(sock, HEADER.size))
+    return channel, _recvExactly(sock, size)
+
+
+def _terminalSize(fd):
+    try:
+        return struct.unpack(
+            'hh', fcntl.ioctl(fd, termios.TIOCGWINSZ, '1234'))
+    except IOError:
+        return None
+
+
+def connect():
+    """
+    Connect to the moa server - returns None if there is no server
+    """
+    path = socketPath()
+    if not os.path.lexists(path):
+        return None
+    for check, isDir in [(os.path.dirname(path), True), (path, False)]:
+        if not isPrivate(check, isDir):
+            sys.stderr.write("moac: not using the moa server, %s is not "
+                             "private\n" % check)
+            return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+
+def runRemote(sock, argv):
+    """
+    Run a moa command through the server & return the rc
+    """
+    request = {
+        'argv': [toWire(x) for x in argv],
+        'cwd': toWire(os.getcwd()),
+        'env': dict([(toWire(k), toWire(v))
+                     for k, v in os.environ.items()]),
+        'tty': [sys.stdout.isatty(), sys.stderr.isatty()],
+        'winsize': _terminalSize(sys.stdout.fileno()),
+    }
+    sendFrame(sock, 'q', json.dumps(request))
+
+    outputs = {'o': sys.stdout, 'e': sys.stderr}
+    while True:
+        channel, data = recvFrame(sock)
+        if channel == 'r':
+            return int(data)
+        outputs[channel].write(data)
+        outputs[channel].flush()
+
+
+def client():
+    sock = connect()
+    if sock is None:
+        #no server - run locally
+        import moa.cli.main
+        moa.cli.main.dispatch()
+        return
+
+    try:
+        rc = runRemote(sock, sys.argv[1:])
+    except KeyboardInterrupt:
+        # closing the connection interrupts the command on the server
+        sock.close()
+        sys.exit(130)
+    except EOFError:
+        sys.stderr.write("Lost connection to the moa server\n")
+        rc = 1
+    sock.close()
+    sys.exit(rc)
+
+
+if __name__ == '__main__':
+    client()
@@ -1,6 +1,9 @@
 """
 Moa CLI code
 """
+import moa.timer
+moa.timer.start('imports')
+
 import os
 import sys
 
@@ -10,6 +13,8 @@ import moa.logger
 import moa.ui
 from moa.sysConf import sysConf
 
+moa.timer.stop('imports')
+
 
 ## Initialize the logger
 l = moa.logger.getLogger(__name__)
@@ -48,23 +53,41 @@ def run_3(wd, exitOnError=True):
     sysConf.pluginHandler.run('pre_create_job')
 
     # create the job
-    job = moa.job.Job(wd)
+    with moa.timer.phase('job'):
+        job = moa.job.Job(wd)
 
     # We should NOT depend on the following (if at all possible)
     sysConf.job = job
+    moa.timer.start('argparse')
     job.defineOptions(parser)
     job.defineCommands(commandparser)
 
+    # plugins are loaded lazily - make sure that the plugin defining
+    # the requested command is loaded (or all plugins, if we need to
+    # show help or complain about an invalid command). Similarly, only
+    # the subparser of the requested command is built.
+    positional = [x for x in sys.argv[1:] if x[0] != '-']
+    if positional and positional[0] in sysConf.commands:
+        sysConf.pluginHandler.loadCommand(positional[0])
+        moa.args.buildCommandParser(positional[0])
+    elif positional or '-h' in sys.argv or '--help' in sys.argv:
+        sysConf.pluginHandler.loadAll()
+        moa.args.buildAllCommandParsers()
+    else:
+        sysConf.pluginHandler.loadCommand(sysConf.default_command)
+        moa.args.buildCommandParser(sysConf.default_command)
+
     # Only now the full set of options is parsed
     # first check if there is a command (i.e. any item on sys.argv
     # not starting with a -. If not add the default command
-    if  [x for x in sys.argv[1:] if x[0] != '-']:
+    if positional:
         args = parser.parse_args()
     else:
         l.debug("Reverting to default command: %s" %
                 sysConf.default_command)
         args = parser.parse_args(sys.argv[1:] +
                                  [sysConf.default_command])
+    moa.timer.stop('argparse')
 
     sysConf.args = args
     sysConf.pluginHandler.run('prepare_3')
@@ -104,7 +127,8 @@ def run_3(wd, exitOnError=True):
         #run the command function
         l.debug("running plugin callback for %s" % command)
         commandFunction = sysConf.commands[command]['call']
-        commandFunction(job, args)
+        with moa.timer.phase('command'):
+            commandFunction(job, args)
 
         #run finish & post plugin hooks
         sysConf.pluginHandler.run("post%s" % command.capitalize(),
@@ -186,13 +210,38 @@ def _handle_error(message):
         sys.stderr.write(str(e) + "\n\n")
 
 
+def _report_timings():
+    """
+    Report the phase timings (moa --timings) - and store them in the
+    log dir of this run (if there is one)
+    """
+    hookStats = sysConf.pluginHandler.getHookStats()
+    job = sysConf.get('job')
+    if job:
+        hookStats = sorted(hookStats + job.pluginHandler.getHookStats(),
+                           key=lambda x: -x[3])
+
+    sys.stderr.write(moa.timer.report(hookStats) + "\n")
+
+    runId = sysConf.get('runId')
+    if not (job and runId):
+        return
+    logDir = os.path.join(job.confDir, 'log.d', '%d' % runId)
+    if not os.path.isdir(logDir):
+        return
+    moa.timer.save(os.path.join(logDir, 'timings.json'), hookStats,
+                   command=sysConf.get('originalCommand'), runId=runId)
+
+
 def dispatch():
     """
     Main run - not much has been prepared yet
     """
 
     ## Initalize system plugins
-    sysConf.pluginHandler = moa.plugin.PluginHandler(sysConf.plugins.system)
+    with moa.timer.phase('plugin init'):
+        sysConf.pluginHandler = moa.plugin.PluginHandler(
+            sysConf.plugins.system)
 
     sysConf.pluginHandler.run('defineOptions')
     ## A hack to set verbosity before reading command line arguments
@@ -222,6 +271,12 @@ def dispatch():
             except ImportError:
                 moa.ui.exitError("Cannot run the profiler - " +
                                  "make sure it is properly installed")
+        elif '--timings' in sys.argv:
+            # commands often end with a sys.exit - report regardless
+            try:
+                run_1()
+            finally:
+                _report_timings()
         else:
             run_1()
     except KeyboardInterrupt:
@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+"""
+Moa server - keep a warm Moa around to execute commands
+
+`moad` imports Moa, its plugins, backends & templates once and then
+listens on a (per user) Unix socket. For each request (sent by the
+thin client, `moac`, see :mod:`moa.cli.client`) it forks; the forked
+process switches to the client's working directory, environment &
+command line and runs the command as `moa` would, streaming
+stdout/stderr back to the client. All import & initialization work
+done by the server is reused by each request.
+
+Interactive input is not forwarded - use plain `moa` for commands
+that prompt for input. Restart the server after upgrading Moa.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import pty
+import select
+import signal
+import socket
+import struct
+import sys
+import termios
+import time
+
+from moa.cli.client import socketPath, sendFrame, recvFrame, isPrivate, \
+    fromWire
+
+#: max no bytes relayed in one go
+CHUNK = 65536
+
+
+def warmUp():
+    """
+    Import everything that a moa invocation normally needs
+    """
+    import moa.cli.main
+    import moa.job
+    import moa.actor
+    import moa.plugin
+    import moa.template
+    import moa.backend.nojob
+    import moa.backend.ruff
+    from moa.sysConf import sysConf
+
+    moa.plugin.PluginHandler(sysConf.plugins.system).loadAll()
+    moa.plugin.PluginHandler(sysConf.plugins.job).loadAll()
+    moa.template.templateList()
+
+
+def _exitCode(code):
+    """
+    Convert a sys.exit argument to a return code
+    """
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code & 0xff
+    sys.stderr.write("%s\n" % code)
+    return 1
+
+
+def _outputPair(isTty, winsize):
+    """
+    Return a (read, write) fd pair for the output of a command - a
+    pseudo terminal if the client writes to a terminal
+    """
+    if not isTty:
+        return os.pipe()
+    master, slave = pty.openpty()
+    if winsize:
+        fcntl.ioctl(slave, termios.TIOCSWINSZ,
+                    struct.pack('HHHH', winsize[0], winsize[1], 0, 0))
+    return master, slave
+
+
+def runCommand(request, stdoutFd, stderrFd):
+    """
+    Run a moa command (in a forked process) - does not return
+    """
+    rc = 1
+    try:
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(stdoutFd, 1)
+        os.dup2(stderrFd, 2)
+        sys.stdout = os.fdopen(1, 'w', 1)
+        sys.stderr = os.fdopen(2, 'w', 0)
+
+        import moa.logger
+        moa.logger.handler.stream = sys.stderr
+
+        os.environ.clear()
+        os.environ.update([(fromWire(k), fromWire(v))
+                           for k, v in request['env'].items()])
+        os.chdir(fromWire(request['cwd']))
+        sys.argv = ['moa'] + [fromWire(x) for x in request['argv']]
+
+        import moa.timer
+        moa.timer.reset()
+
+        from moa.sysConf import sysConf
+        sysConf.loadEnviron()
+
+        import moa.cli.main
+        try:
+            moa.cli.main.dispatch()
+            rc = 0
+        except SystemExit, e:
+            rc = _exitCode(e.code)
+    except:
+        import traceback
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(rc)
+
+
+def _returnCode(status):
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def handleRequest(conn):
+    """
+    Handle a single request (in a forked process): run the command
+    & relay output until it finishes
+    """
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    channel, data = recvFrame(conn)
+    if channel != 'q':
+        return
+    request = json.loads(data)
+    outTty, errTty = request.get('tty', [False, False])
+
+    outRead, outWrite = _outputPair(outTty, request.get('winsize'))
+    errRead, errWrite = _outputPair(errTty, request.get('winsize'))
+
+    pid = os.fork()
+    if pid == 0:
+        conn.close()
+        os.close(outRead)
+        os.close(errRead)
+        runCommand(request, outWrite, errWrite)
+
+    os.close(outWrite)
+    os.close(errWrite)
+
+    channels = {outRead: 'o', errRead: 'e'}
+    status = None
+    clientGone = False
+
+    while channels:
+        watch = channels.keys()
+        if not clientGone:
+            watch.append(conn)
+        ready = select.select(watch, [], [], 0.1)[0]
+        if conn in ready:
+            if not conn.recv(CHUNK):
+                #client hung up - interrupt the command
+                clientGone = True
+                os.kill(pid, signal.SIGINT)
+        for fd in [x for x in ready if x in channels]:
+            try:
+                data = os.read(fd, CHUNK)
+            except OSError:
+                #EIO - the pseudo terminal was closed
+                data = ''
+            if not data:
+                del channels[fd]
+                continue
+            if not clientGone:
+                try:
+                    sendFrame(conn, channels[fd], data)
+                except socket.error:
+                    clientGone = True
+                    os.kill(pid, signal.SIGINT)
+
+        if status is None:
+            wpid, wstatus = os.waitpid(pid, os.WNOHANG)
+            if wpid:
+                status = wstatus
+        elif not ready:
+            # the command has finished & nothing more is coming in;
+            # whatever keeps the output open (i.e. a --bg run) is not
+            # our concern anymore
+            break
+
+    if status is None:
+        status = os.waitpid(pid, 0)[1]
+
+    if not clientGone:
+        sendFrame(conn, 'r', str(_returnCode(status)))
+
+
+def _checkPeer(conn):
+    """
+    Only accept connections from the user running this server
+    """
+    SO_PEERCRED = getattr(socket, 'SO_PEERCRED', 17)
+    try:
+        creds = conn.getsockopt(socket.SOL_SOCKET, SO_PEERCRED,
+                                struct.calcsize('3i'))
+    except socket.error:
+        #platform without SO_PEERCRED - rely on the directory
+        #permissions
+        return True
+    pid, uid, gid = struct.unpack('3i', creds)
+    return uid == os.getuid()
+
+
+def serve(sock, idle=0):
+    """
+    Accept & handle requests until idle for `idle` seconds (0 means:
+    forever)
+    """
+    # auto reap the request handlers
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    lastRequest = time.time()
+    while True:
+        ready = select.select([sock], [], [], 5)[0]
+        if not ready:
+            if idle and time.time() - lastRequest > idle:
+                return
+            continue
+
+        conn, _ = sock.accept()
+        lastRequest = time.time()
+        if not _checkPeer(conn):
+            conn.close()
+            continue
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        if os.fork() == 0:
+            sock.close()
+            try:
+                handleRequest(conn)
+            finally:
+                os._exit(0)
+        conn.close()
+
+
+def _pidFile():
+    return os.path.join(os.path.dirname(socketPath()), 'pid')
+
+
+def _runningPid():
+    """
+    Return the pid of the running server, or None
+    """
+    if not isPrivate(os.path.dirname(_pidFile()), isDir=True):
+        return None
+    try:
+        with open(_pidFile()) as F:
+            pid = int(F.read().strip())
+        os.kill(pid, 0)
+        return pid
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _daemonize():
+    if os.fork() != 0:
+        os._exit(0)
+    os.setsid()
+    if os.fork() != 0:
+        os._exit(0)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in [0, 1, 2]:
+        os.dup2(devnull, fd)
+
+
+def moad():
+    parser = argparse.ArgumentParser(
+        description='Run a Moa server that executes commands sent by moac')
+    parser.add_argument('--stop', action='store_true',
+                        help='stop the running server')
+    parser.add_argument('-f', '--foreground', action='store_true',
+                        help='do not detach from the terminal')
+    parser.add_argument('--idle', type=int, default=3600,
+                        help='stop after this many seconds without ' +
+                        'requests (0: never)')
+    args = parser.parse_args()
+
+    pid = _runningPid()
+    if args.stop:
+        if pid:
+            os.kill(pid, signal.SIGTERM)
+        return
+
+    if pid:
+        sys.stderr.write("moad is already running (pid %d)\n" % pid)
+        sys.exit(-1)
+
+    path = socketPath()
+    sockDir = os.path.dirname(path)
+    if not os.path.lexists(sockDir):
+        os.makedirs(sockDir, 0700)
+    if not isPrivate(sockDir, isDir=True):
+        sys.stderr.write("moad: refusing to use %s - it must be a directory "
+                         "owned by you, with mode 0700\n" % sockDir)
+        sys.exit(-1)
+    if os.path.lexists(path):
+        os.unlink(path)
+
+    warmUp()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, 0600)
+    sock.listen(32)
+
+    if not args.foreground:
+        _daemonize()
+
+    with open(_pidFile(), 'w') as F:
+        F.write("%d" % os.getpid())
+
+    def _stop(signum, frame):
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, _stop)
+
+    try:
+        serve(sock, args.idle)
+    finally:
+        sock.close()
+        for f in [path, _pidFile()]:
+            if os.path.exists(f):
+                os.unlink(f)
+
+
+if __name__ == '__main__':
+    moad()
@@ -0,0 +1,179 @@
+# Copyright 2009-2011 Mark Fiers
+# The New Zealand Institute for Plant & Food Research
+#
+# This file is part of Moa - http://github.com/mfiers/Moa
+#
+# Licensed under the GPL license (see 'COPYING')
+#
+"""
+moa.digest
+----------
+
+Content digests of files, cached by (device, inode, size, mtime) - as
+long as these do not change, a file is not read again.
+
+>>> import tempfile
+>>> d = tempfile.mkdtemp()
+>>> fileName = os.path.join(d, 'data.txt')
+>>> with open(fileName, 'w') as F:
+...     F.write('hello')
+>>> os.utime(fileName, (1000000000, 1000000000))
+>>> cache = HashCache(os.path.join(d, 'hash.cache'))
+>>> cache.digest(fileName)
+'aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d'
+>>> cache.save()
+>>> HashCache(os.path.join(d, 'hash.cache')).cached(fileName)
+'aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d'
+>>> cache.digest(os.path.join(d, 'missing')) is None
+True
+"""
+
+import os
+import time
+import hashlib
+import cPickle
+import multiprocessing.pool
+
+import moa.utils
+import moa.logger
+
+l = moa.logger.getLogger(__name__)
+
+#: bump when the format of the cache changes
+CACHEVERSION = 1
+
+#: no bytes read at once
+BLOCKSIZE = 1 << 20
+
+#: default number of threads hashing files
+THREADS = 4
+
+
+def statKey(fileName):
+    """
+    Return (device, inode, size, mtime) of a file - or None if it
+    does not exist
+    """
+    try:
+        st = os.stat(fileName)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime)
+
+
+def fileDigest(fileName):
+    """
+    Return the sha1 hex digest of the contents of a file - or None
+    if it cannot be read
+    """
+    h = hashlib.sha1()
+    try:
+        with open(fileName, 'rb') as F:
+            while True:
+                block = F.read(BLOCKSIZE)
+                if not block:
+                    break
+                h.update(block)
+    except IOError:
+        return None
+    return h.hexdigest()
+
+
+class HashCache(object):
+    """
+    Cache of file digests
+
+    :param cacheFile: file to store the cache in
+    """
+    def __init__(self, cacheFile):
+        self.cacheFile = cacheFile
+        self.changed = False
+        self.digests = {}
+        #files changed too recently to trust their mtime
+        self.recent = set()
+        try:
+            with open(cacheFile, 'rb') as F:
+                version, digests = cPickle.load(F)
+            if version == CACHEVERSION:
+                self.digests = digests
+        except Exception:
+            #no (or an unreadable) cache
+            pass
+
+    def cached(self, fileName):
+        """
+        Return the digest of a file if known & still valid - otherwise
+        None
+        """
+        path = os.path.abspath(fileName)
+        key = statKey(path)
+        if key is None:
+            return None
+        known = self.digests.get(path)
+        if known and known[0] == key:
+            return known[1]
+        return None
+
+    def digest(self, fileName):
+        """
+        Return the digest of a file - or None if it does not exist
+        """
+        rv = self.cached(fileName)
+        if rv is not None:
+            return rv
+        self.update([fileName], threads=1)
+        return self.cached(fileName)
+
+    def update(self, fileNames, threads=THREADS):
+        """
+        Make sure the digests of all files are known - hashes changed
+        files in parallel (hashlib releases the GIL)
+        """
+        todo = []
+        for fileName in fileNames:
+            path = os.path.abspath(fileName)
+            key = statKey(path)
+            if key is None:
+                continue
+            known = self.digests.get(path)
+            if known and known[0] == key:
+                continue
+            todo.append((path, key))
+
+        if not todo:
+            return
+
+        l.debug("hashing %d files" % len(todo))
+        paths = [x[0] for x in todo]
+        if threads > 1 and len(todo) > 1:
+            pool = multiprocessing.pool.ThreadPool(threads)
+            try:
+                digests = pool.map(fileDigest, paths)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            digests = [fileDigest(x) for x in paths]
+
+        now = time.time()
+        for (path, key), digest in zip(todo, digests):
+            if digest is None:
+                continue
+            self.digests[path] = (key, digest)
+            # a file changed within the last second might change
+            # again without a change in mtime - do not store it
+            if key[3] >= now - 1:
+                self.recent.add(path)
+        self.changed = True
+
+    def save(self):
+        """
+        Store the cache (if anything changed)
+        """
+        if not self.changed:
+            return
+        digests = dict([(k, v) for k, v in self.digests.items()
+                        if not k in self.recent])
+        moa.utils.atomicWrite(self.cacheFile, cPickle.dumps(
+            (CACHEVERSION, digests), cPickle.HIGHEST_PROTOCOL))
+        self.changed = False
@@ -11,32 +11,170 @@
 """
 
 import os
+import re
 import sys
+import time
+import cPickle
 
 import fist
 
 import moa.ui
+import moa.scan
+import moa.pathlist
 import moa.utils
 import moa.logger
 
 l = moa.logger.getLogger(__name__)
 
 from moa.sysConf import sysConf
-    
+
+#: bump when the format of the fileset cache changes
+CACHEVERSION = 2
+
+#: characters that make a pattern a glob
+GLOBCHARS = re.compile(r'[*?\[]')
+
+
+def _dirStamps(pattern, context):
+    """
+    Return a list of (directory, mtime) of the directories that a
+    (space separated list of) glob pattern(s) looks at - or None if
+    that cannot be determined cheaply (i.e. if there are wildcards in
+    a directory name)
+    """
+    rv = []
+    for part in str(pattern).split():
+        dirName = os.path.dirname(os.path.expanduser(part))
+        if GLOBCHARS.search(dirName):
+            return None
+        path = os.path.join(context, dirName)
+        try:
+            rv.append((path, os.stat(path).st_mtime))
+        except OSError:
+            rv.append((path, None))
+    return rv
+
+
+def _loadCache(job):
+    """
+    Load the fileset cache of a job: fsid -> (key, pickled fileset)
+
+    The cache is only valid in the directory it was written in - the
+    keys & filesets refer to that directory (i.e. after `cp -a A B`,
+    B does not use the cache of A)
+    """
+    cacheFile = os.path.join(job.confDir, 'filesets.cache')
+    try:
+        with open(cacheFile, 'rb') as F:
+            version, wd, cached = cPickle.load(F)
+        if version == CACHEVERSION and wd == os.path.abspath(job.wd):
+            return cached
+    except Exception:
+        #no (or an unreadable) cache
+        pass
+    return {}
+
+
+def _saveCache(job, cached):
+    cacheFile = os.path.join(job.confDir, 'filesets.cache')
+    moa.utils.atomicWrite(cacheFile, cPickle.dumps(
+        (CACHEVERSION, os.path.abspath(job.wd), cached),
+        cPickle.HIGHEST_PROTOCOL))
+
+
+def _stampsValid(stamps):
+    """
+    Check that none of the directories in a list of (directory,
+    mtime) tuples changed - and that none of them changed so recently
+    (within the last second) that a change might go unnoticed
+    """
+    now = time.time()
+    for path, mtime in stamps:
+        try:
+            current = os.stat(path).st_mtime
+        except OSError:
+            current = None
+        if current != mtime:
+            return False
+        if mtime is not None and mtime >= now - 1:
+            return False
+    return True
+
+
+def _setKey(pattern, stamps):
+    """
+    Return the cache key of a set fileset resolved from the given
+    directories - or None if that outcome cannot be cached
+    """
+    if stamps is None:
+        return None
+    # a directory changed within the last second might still
+    # change without a change in mtime - do not trust it yet
+    now = time.time()
+    for path, mtime in stamps:
+        if mtime is not None and mtime >= now - 1:
+            return None
+    return ('set', pattern, stamps)
+
+
+def _cachedKey(fs, pattern, cachedKey, keys):
+    """
+    Check if a cached fileset is still valid - if so, return its key,
+    otherwise None
+    """
+    if cachedKey is None:
+        return None
+    if fs.type == 'set':
+        if cachedKey[0] == 'set' and cachedKey[1] == pattern and \
+                _stampsValid(cachedKey[2]):
+            return cachedKey
+    elif fs.type == 'map':
+        sourceKey = keys.get(fs.source)
+        if sourceKey is not None and \
+                cachedKey == ('map', pattern, sourceKey):
+            return cachedKey
+    return None
+
+
+def _resolveSet(pattern, context):
+    """
+    Resolve a set fileset - returns the fileset & its cache key
+    """
+    files = fist.fistFileset(pattern, context=context)
+    if not moa.scan.canScan(pattern):
+        stamps = _dirStamps(pattern, context)
+        files.resolve()
+        return files, _setKey(pattern, stamps)
+
+    matches, stamps = moa.scan.scan(pattern, context)
+    files.extend(matches)
+    files.resolved = True
+    return files, _setKey(pattern, stamps)
+
+
+def _writeFof(fofFile, files):
+    """
+    Write a file of files - only if the contents changed
+    """
+    content = "\n".join(files) + "\n"
+    if os.path.exists(fofFile):
+        try:
+            if os.path.getsize(fofFile) == len(content):
+                with open(fofFile) as F:
+                    if F.read() == content:
+                        return
+        except (IOError, OSError):
+            pass
+    with open(fofFile, 'w') as F:
+        F.write(content)
+
+
 def tmpE(message):
     moa.ui.error("Template error")
     moa.ui.exitError(message)
 
 def prepare(job):
 
-    try:
-        renderedJobConf = job.conf.render()
-    except:
-        import pprint
-        l.critical("%s" % pprint.pformat(job))
-        l.critical("%s" % pprint.pformat(job.conf))
-        raise
-        
     if not job.template.has_key('filesets'):
         return
 
@@ -103,6 +241,9 @@ def prepare(job):
         if not fs.category in ['input', 'prerequisite']:
             job.conf.doNotCheck.append('%s' % fsid)
 
+    # the fileset parameters were (re)defined
+    job.conf.invalidate()
+
 def render(job):
     """
     render all filesets - i.e. figure out what files belong in what
@@ -123,6 +264,11 @@ def render(job):
     allSets = copy.copy(fileSets)
     allSets.sort()
 
+    #resolved filesets from an earlier invocation
+    cached = _loadCache(job)
+    cacheChanged = False
+    keys = {}
+
     while True:
             
         if len(fileSets) == 0: break
@@ -137,10 +283,23 @@ def render(job):
         if not renJobConf.has_key(fsid):
             moa.ui.exitError("Undefined fileset %s" % fsid)
 
+        key = None
+        files = None
+        if fsid in cached:
+            key = _cachedKey(fs, renJobConf[fsid], cached[fsid][0], keys)
+        if key is not None:
+            try:
+                files = cPickle.loads(cached[fsid][1])
+                l.debug("fileset %s is unchanged" % fsid)
+            except Exception:
+                key = None
+                files = None
+
         #Resolve filesets - first the NON-map sets
-        if fs.type == 'set':
-            files = fist.fistFileset(renJobConf[fsid], context=job.wd)
-            files.resolve()
+        if files is not None:
+            pass
+        elif fs.type == 'set':
+            files, key = _resolveSet(renJobConf[fsid], job.wd)
         elif fs.type == 'single':
             files = fist.fistSingle(renJobConf[fsid], context=job.wd)
             files.resolve()
@@ -156,19 +315,33 @@ def render(job):
             source = job.data.filesets[fs.source].files
             files = fist.fistMapset(renJobConf[fsid], context=job.wd)
             files.resolve(source)
+            if keys.get(fs.source) is not None:
+                key = ('map', renJobConf[fsid], keys[fs.source])
         else:
             moa.ui.exitError("Invalid data set type %s for data set %s" % (
                     fs.type, fsid))
-            
+
+        keys[fsid] = key
+        if key is not None and not (fsid in cached and
+                                    cached[fsid][0] == key):
+            try:
+                cached[fsid] = (key, cPickle.dumps(
+                    files, cPickle.HIGHEST_PROTOCOL))
+                cacheChanged = True
+            except Exception:
+                l.debug("cannot cache fileset %s" % fsid)
+
         l.debug("Recovered %d files for fileset %s" % (len(files), fsid))
         job.data.filesets[fsid].files = files
         try:
-            with open(os.path.join(job.wd, '.moa', '%s.fof' % fsid), 'w') as F:
-                F.write("\n".join(files) + "\n")
+            _writeFof(os.path.join(job.wd, '.moa', '%s.fof' % fsid), files)
         except:
             moa.ui.warn("Unable to write FOF for filesets %s" % fsid)
             moa.ui.warn("This might results in trouble")
             
+    if cacheChanged:
+        _saveCache(job, cached)
+
     #rearrange the files for use by the job
     job.data.inputs = []
     job.data.outputs = []
@@ -186,6 +359,10 @@ def render(job):
         if fs.category == 'other':
             job.data.others.append(fsid)
 
+        #store the file names compactly
+        job.data.filesets[fsid].files = moa.pathlist.compact(
+            job.data.filesets[fsid].files)
+
         #add a shortcut - easier access alter
         job.data['%s_files' % fsid] = job.data.filesets[fsid].files
 
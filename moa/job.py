@@ -24,6 +24,7 @@ import shutil
 import moa.ui
 import moa.args
 import moa.actor
+import moa.timer
 import moa.utils
 import moa.logger
 import moa.plugin
@@ -107,7 +108,9 @@ class Job(object):
         """
 
         #prepare the plugins
-        self.pluginHandler = moa.plugin.PluginHandler(sysConf.plugins.job)
+        with moa.timer.phase('job plugin init'):
+            self.pluginHandler = moa.plugin.PluginHandler(
+                sysConf.plugins.job)
 
         if wd[-1] == '/':
             wd = wd[:-1]
@@ -153,13 +156,17 @@ class Job(object):
 
         self.run_hook('prepare')
 
-        self.loadTemplate()
+        with moa.timer.phase('template'):
+            self.loadTemplate()
         l.debug("template loaded: {}".format(self.template.name))
-        self.load_config()
+        with moa.timer.phase('load_config'):
+            self.load_config()
         #prepare filesets (if need be)
         self.run_hook('pre_filesets')
-        self.prepareFilesets()
-        self.renderFilesets()
+        with moa.timer.phase('prepareFilesets'):
+            self.prepareFilesets()
+        with moa.timer.phase('renderFilesets'):
+            self.renderFilesets()
 
     def load_config(self):
         # then load the job configuration
@@ -393,15 +400,16 @@ class Job(object):
     def defineCommands(self, commandparser):
         """
         Register template commands with the argparser
-        """
-        parser, cparser = moa.args.getParser()
 
+        The subparsers are only built when a command is selected (see
+        :class:`moa.args.CommandParser`)
+        """
         for comm in ['unittest', 'prepare', 'finish', 'clean']:
             if self.hasCommand(comm):
                 # this does not have to be defined in the .moa - if it is here
                 # we'll register it
                 hlp = 'run "%s" for this template' % comm
-                cp = cparser.add_parser(
+                cp = moa.args.CommandParser(
                     comm, help=hlp)
 
                 sysConf.commands[comm] = {
@@ -409,7 +417,8 @@ class Job(object):
                     'long': hlp,
                     'source': 'template',
                     'needsJob': True,
-                    'call': self.execute
+                    'call': self.execute,
+                    'cp': cp,
                     }
 
         for c in self.template.commands:
@@ -419,8 +428,8 @@ class Job(object):
             if not hlp:
                 hlp = '(Execute template command "%s")' % c
 
-            cp = cparser.add_parser(
-                str(c), help=hlp)
+            cp = moa.args.CommandParser(
+                str(c), help=hlp, setup=self._defineCommandOptions)
 
             cp.add_argument(
                 "-v", "--verbose", dest="verbose", action="store_true",
@@ -434,19 +443,56 @@ class Job(object):
                 "--profile", dest="profile", action="store_true",
                 help="Run the profiler")
 
+            cp.add_argument(
+                "--timings", dest="timings", action="store_true",
+                help="Report the time spent in each phase of this run")
+
             cp.add_argument(
                 "-j", dest="threads", type=int,
                 default=1, help="No threads to use when running Ruffus")
 
-            self.run_hook('defineCommandOptions', parser=cp)
+            cp.add_argument(
+                "--uptodate", dest="uptodate", choices=['mtime', 'hash'],
+                help="Decide what to rerun on file timestamps (mtime) " +
+                "or on content digests (hash) - default: the " +
+                "'uptodate' configuration setting")
+
+            cp.add_argument(
+                "--executor", dest="executor", choices=['ruffus', 'native'],
+                help="Run map & reduce commands through ruffus or the " +
+                "native process pool - default: the command's or " +
+                "the 'executor' configuration setting")
+
+            cp.add_argument(
+                "--batch_size", dest="batch_size", type=int,
+                help="Run the scripts of this many map items in one " +
+                "shell - default: the command's 'batch_size' or 1")
+
+            cp.add_argument(
+                "--warm", dest="actorId", action="store_const",
+                const="warm", help="Run scripts in a persistent (warm) " +
+                "shell per process instead of starting a shell for each")
+
+            cp.add_argument(
+                "--resume", dest="resume", action="store_true",
+                help="Skip the items completed by the last (interrupted) " +
+                "run of this command & remove partial output files")
+
             sysConf.commands[c] = {
                 'desc': hlp,
                 'long': hlp,
                 'source': 'template',
                 'needsJob': True,
-                'call': self.execute
+                'call': self.execute,
+                'cp': cp,
             }
 
+    def _defineCommandOptions(self, parser):
+        """
+        Let the job plugins add options to a template command
+        """
+        self.run_hook('defineCommandOptions', parser=parser)
+
     def defineOptions(self, parser):
         """
         Set command line options - deferred to the backend - PER COMMAND
@@ -499,7 +545,8 @@ class Job(object):
         """
         self.template = moa.template.Template(self.wd)
         l.debug("Job loaded template %s" % self.template.name)
-        self.loadBackend()
+        with moa.timer.phase('backend'):
+            self.loadBackend()
 
     def loadBackend(self):
         """
@@ -13,13 +13,107 @@ moa job configuration
 """
 import os
 import re
+import cPickle
+import collections
 
 import Yaco
 import jinja2.exceptions
+import jinja2.meta
 import moa.logger as l
 import moa.moajinja
+import moa.timer
 import moa.ui
 import moa.utils
+from moa.sysConf import sysConf
+
+#: what the parameter index knows about a parameter
+Parameter = collections.namedtuple(
+    'Parameter', ['recursive', 'system', 'private', 'preventExpansion',
+                  'hasDefault', 'default', 'callback'])
+
+#: index entry for parameters not defined by the template
+UNDEFINED = Parameter(recursive=True, system=False, private=False,
+                      preventExpansion=False, hasDefault=False,
+                      default=None, callback=None)
+
+#: process wide cache of parsed configuration files:
+#: file -> (stat key, pickled configuration)
+_configCache = {}
+
+
+def loadConfigFile(confFile):
+    """
+    Return a Yaco with the contents of a configuration file. Parsed
+    files are cached (for as long as their path, mtime, size & inode
+    stay the same) so that jobs sharing ancestors share the parse.
+
+    >>> import tempfile
+    >>> confFile = os.path.join(tempfile.mkdtemp(), 'config')
+    >>> with open(confFile, 'w') as F:
+    ...     F.write('title: test\\n')
+    >>> y = loadConfigFile(confFile)
+    >>> assert(y.title == 'test')
+    >>> y.title = 'changed'
+    >>> assert(loadConfigFile(confFile).title == 'test')
+    >>> assert(confFile in _configCache)
+    """
+    st = os.stat(confFile)
+    key = (st.st_mtime, st.st_size, st.st_ino)
+    if confFile in _configCache and _configCache[confFile][0] == key:
+        blob = _configCache[confFile][1]
+    else:
+        y = Yaco.Yaco()
+        y.load(confFile)
+        blob = cPickle.dumps(y.simple(), cPickle.HIGHEST_PROTOCOL)
+        _configCache[confFile] = (key, blob)
+
+    rv = Yaco.Yaco()
+    rv.update(cPickle.loads(blob))
+    return rv
+
+
+def getProjectRoot():
+    """
+    Return the directory above which no (inherited) job configuration
+    is loaded, or None if all the way up to / is fine
+    """
+    root = sysConf.get('project_root')
+    if not root:
+        return None
+    return os.path.abspath(os.path.expanduser(root))
+
+
+def renderOrder(deps):
+    """
+    Sort parameters so that each comes after the parameters it refers
+    to. Returns the sorted list and a list of parameters that cannot
+    be sorted because they are part of (or depend on) a cycle.
+
+    :param deps: dict: parameter -> set of parameters it refers to
+
+    >>> renderOrder({'a': set(['b']), 'b': set(), 'c': set(['a', 'b'])})
+    (['b', 'a', 'c'], [])
+    >>> renderOrder({'a': set(['b']), 'b': set(['a']), 'c': set()})
+    (['c'], ['a', 'b'])
+    """
+    waitingFor = dict([(k, set(v)) for k, v in deps.items()])
+    dependents = {}
+    for k, v in deps.items():
+        for d in v:
+            dependents.setdefault(d, []).append(k)
+
+    ready = sorted([k for k, v in waitingFor.items() if not v])
+    order = []
+    while ready:
+        k = ready.pop(0)
+        order.append(k)
+        for dependent in sorted(dependents.get(k, [])):
+            waitingFor[dependent].discard(k)
+            if not waitingFor[dependent]:
+                ready.append(dependent)
+
+    unresolved = sorted([k for k, v in waitingFor.items() if v])
+    return order, unresolved
 
 
 class JobConf(object):
@@ -39,6 +133,17 @@ class JobConf(object):
         self.jobConfFile = os.path.join(self.job.confDir, 'config')
         self._rendered = {}
 
+        #: the rendered configuration is cached until the
+        #: configuration changes (see invalidate)
+        self._version = 0
+        self._renderKey = None
+        self._renderCount = 0
+        self._referenced = set()
+
+        #: merged parameter index (see _getIndex)
+        self._index = {}
+        self._indexKey = None
+
         #: these fields are not to be saved
         self.doNotSave = []
 
@@ -55,7 +160,7 @@ class JobConf(object):
 
         #load the local conf separately -
         if os.path.exists(self.jobConfFile):
-            self.localConf.load(self.jobConfFile)
+            self.localConf.update(loadConfigFile(self.jobConfFile))
 
         #create a list of conf files to load:
         listToLoad = []
@@ -63,6 +168,7 @@ class JobConf(object):
         if not parsePath[-1] == '/':
             parsePath += '/'
         lookAt = parsePath
+        projectRoot = getProjectRoot()
 
         while True:
 
@@ -79,6 +185,10 @@ class JobConf(object):
             if os.path.isfile(thisConfig):
                 listToLoad.insert(0,  (lookAt, thisConfig))
 
+            # do not look further than the project root
+            if abspath == projectRoot:
+                break
+
             #look at: one directory up
             lookAt = lookAt + '../'
 
@@ -126,6 +236,7 @@ class JobConf(object):
 
         #self.template.parameters[k].private = True
         self.jobConf[k] = v
+        self.invalidate()
 
     def getFlags(self, key):
         rv = []
@@ -154,70 +265,215 @@ class JobConf(object):
         except jinja2.exceptions.TemplateSyntaxError:
             return value
 
+    def invalidate(self):
+        """
+        Forget the cached rendered configuration & parameter index -
+        call this after changes the cache key cannot see (such as a
+        changed fileset)
+        """
+        self._version += 1
+
+    def _cacheKey(self):
+        """
+        Key of the cached rendered configuration & parameter index -
+        changes with the configuration, the template & the (re)definition
+        of template parameters
+
+        >>> import moa.job
+        >>> job = moa.job.newTestJob('unittest')
+        >>> job.template.parameters.answer = {'default': 'a'}
+        >>> job.conf.render()['answer']
+        'a'
+        >>> job.template.parameters.answer = {'default': 'b'}
+        >>> job.conf.render()['answer']
+        'b'
+        """
+        parameters = self.job.template.parameters
+        return (self._version, id(self.job.template), id(parameters),
+                len(parameters), getattr(parameters, 'getVersion',
+                                         lambda: 0)())
+
+    def _getIndex(self):
+        """
+        Return the merged parameter index: a dict with, for each known
+        parameter (defined in the template or the configuration), a
+        :class:`Parameter` with what the template says about it. The
+        index is rebuilt when the configuration or template changes.
+
+        >>> import moa.job
+        >>> job = moa.job.newTestJob('unittest')
+        >>> job.template.parameters.deep = {'recursive': True}
+        >>> job.conf._is_recursive('deep')
+        True
+        >>> job.template.parameters.deep = {'recursive': False}
+        >>> job.conf._is_recursive('deep')
+        False
+        """
+        key = self._cacheKey()
+        if key == self._indexKey:
+            return self._index
+
+        index = dict.fromkeys(self.jobConf.keys(), UNDEFINED)
+        for k, pd in self.job.template.parameters.items():
+            index[k] = Parameter(
+                recursive=pd.get('recursive', True),
+                system=bool(pd.get('system')),
+                private=bool(pd.get('private')),
+                preventExpansion=pd.get('prevent_expansion', False),
+                hasDefault='default' in pd,
+                default=pd.get('default'),
+                callback=pd.get('callback'))
+
+        self._index = index
+        self._indexKey = key
+        return index
+
+    def getRenderCount(self):
+        """
+        Return the number of times the configuration was actually
+        rendered (i.e. not served from the cache)
+
+        >>> import moa.job
+        >>> job = moa.job.newTestJob('unittest')
+        >>> job.conf['a'] = '{{ b }}x'
+        >>> job.conf['b'] = 'y'
+        >>> count = job.conf.getRenderCount()
+        >>> assert(job.conf.render()['a'] == 'yx')
+        >>> assert(job.conf.getRendered('a') == 'yx')
+        >>> job.conf.getRenderCount() - count
+        1
+        >>> job.conf['b'] = 'z'
+        >>> assert(job.conf.render()['a'] == 'zx')
+        >>> job.conf.getRenderCount() - count
+        2
+        """
+        return self._renderCount
+
     def render(self, force=False, showPrivate=True):
+        """
+        Return a dict with all parameters, with jinja2 values
+        expanded. The result is cached until the configuration changes
+        and must not be modified.
+
+        :param force: do not use the cached configuration
+        :param showPrivate: include private parameters
+        """
+        key = self._cacheKey()
+        if force:
+            self._rendered = self._render()
+        elif key != self._renderKey and not self._extendRendered(key):
+            self._rendered = self._render()
+        self._renderKey = key
+
+        rv = self._rendered
+        if showPrivate:
+            return rv
+        else:
+            ov = {}
+            for k in rv.keys():
+                if not self.isPrivate(k):
+                    ov[k] = rv[k]
+            return ov
+
+    def _extendRendered(self, key):
+        """
+        Add newly defined (or redefined) template parameters to the
+        cached rendered configuration without a full render. This is
+        only possible if nothing else changed, none of these
+        parameters needs expanding and no jinja value refers to them.
+        """
+        if (self._renderKey is None or
+                self._renderKey[:3] != key[:3] or
+                self._renderKey[3] > key[3]):
+            return False
+
+        parameters = self.job.template.parameters
+        if hasattr(parameters, 'changedSince'):
+            redefined = set(parameters.changedSince(self._renderKey[4]))
+        elif self._renderKey[4:] != key[4:]:
+            return False
+        else:
+            redefined = set()
+
+        new = {}
+        for k in parameters.keys():
+            if k in self._rendered and not k in redefined:
+                continue
+            if k in self._referenced:
+                return False
+            v = self[k]
+            if isinstance(v, str) and ('{{' in v or '{%' in v):
+                return False
+            new[k] = v
+
+        self._rendered.update(new)
+        return True
+
+    def _render(self):
+        """
+        Render the configuration - see :meth:`render`
+        """
+        self._renderCount += 1
+        moa.timer.count('config render')
 
         rv = {}
-        toExpand = []
+        toExpand = {}
 
         # first get the vars that do not need expanding and remember
         # vars that do need jinja2 rendering
-        for k in self.keys():
+        index = self._getIndex()
+        for k in index.keys():
             v = self[k]
-            templateInfo = self.job.template.parameters[k]
-            if templateInfo.get('prevent_expansion', False):
+            if index[k].preventExpansion:
                 rv[k] = v
             elif (isinstance(v, str) and
                   ('{{' in str(v) or '{%' in v)):
-                toExpand.append(k)
+                toExpand[k] = v
             else:
                 rv[k] = v
 
-        # expand the needed jinja vars
+        # find out which parameters each jinja value refers to
         env = moa.moajinja.getStrictEnv()
-        iteration = 0
-        while toExpand:
-            iteration += 1
-            if iteration > 10:
-                l.debug("hard to solve -- too many iterations")
-                l.debug("unsolved are %s" % str(toExpand))
-                for i in toExpand:
-                    l.debug("  - %s : %s" % (i, self[i]))
-                break
-            key = toExpand.pop(0)
-            #create the template
+        parsed = {}
+        deps = {}
+        for key, value in toExpand.items():
             try:
-                jt = env.from_string(self[key])
+                parsed[key] = env.parse(value)
             except jinja2.exceptions.TemplateSyntaxError:
-                rv[key] = self[key]
+                #ignore this one - cannot be improved
+                rv[key] = value
                 continue
-
+            deps[key] = jinja2.meta.find_undeclared_variables(parsed[key])
+
+        #: all variables referred to by jinja values
+        self._referenced = set()
+        for key in deps:
+            self._referenced.update(deps[key])
+
+        for key in deps:
+            deps[key] = set([x for x in deps[key] if x in deps])
+
+        # expand the needed jinja vars - each exactly once, after the
+        # vars it depends on
+        order, unresolved = renderOrder(deps)
+        if unresolved:
+            l.warning("Cannot expand cyclic parameter definitions: %s" %
+                      ", ".join(["%s (uses %s)" % (k, ", ".join(
+                          sorted(deps[k]))) for k in unresolved]))
+            for key in unresolved:
+                rv[key] = toExpand[key]
+
+        for key in order:
             try:
-                nw = jt.render(rv)
+                rv[key] = env.from_string(parsed[key]).render(rv)
             except jinja2.exceptions.UndefinedError:
-                # not (yet?) possible
-                if len(toExpand) == 0:
-                    l.debug("unsolvable configuration " +
-                            "- cannot expand '%s'" % key)
-                    rv[key] = self[key]
-                    break
-                toExpand.append(key)
-                continue
+                l.debug("unsolvable configuration " +
+                        "- cannot expand '%s'" % key)
+                rv[key] = toExpand[key]
             except jinja2.exceptions.TemplateSyntaxError:
-                #ignore this one - cannot be improved
-                rv[key] = self[key]
-
-            rv[key] = nw
-
-        self._rendered = rv
+                rv[key] = toExpand[key]
 
-        if showPrivate:
-            return rv
-        else:
-            ov = {}
-            for k in rv.keys():
-                if not self.isPrivate(k):
-                    ov[k] = rv[k]
-            return ov
+        return rv
 
     def isPrivate(self, k):
         """
@@ -231,17 +487,17 @@ class JobConf(object):
         if k in self.private:
             return True
 
-        if self.job.template.parameters[k].private:
+        if self._getIndex().get(k, UNDEFINED).private:
             return True
 
         return False
 
     def getPublicParameters(self):
         rv = []
-        for k in self.keys():
+        for k, info in self._getIndex().items():
             if k in self.private:
                 continue
-            if self.job.template.parameters[k].private:
+            if info.private:
                 continue
             rv.append(k)
         return rv
@@ -264,8 +520,9 @@ class JobConf(object):
         else:
             loadingRecursive = True
 
-        y = Yaco.Yaco()
-        y.load(confFile)
+        self.invalidate()
+
+        y = loadConfigFile(confFile)
 
         if not delta:
             #loading the current directory - no fancy stuff...
@@ -343,13 +600,10 @@ class JobConf(object):
         return a dict with all known parameters and values, either
         defined in the job configuration of the template
         """
-        rvt = set(self.job.template.parameters.keys())
-        rvj = set(self.jobConf.keys())
-        return list(rvt.union(rvj))
+        return self._getIndex().keys()
 
     def _is_recursive(self, key):
-        keyInfo = self.job.template.parameters.get(key, {})
-        return keyInfo.get('recursive', True)
+        return self._getIndex().get(key, UNDEFINED).recursive
 
     def _get_conf(self, key):
         if self._is_recursive(key):
@@ -358,7 +612,7 @@ class JobConf(object):
             return self.localConf
 
     def is_local(self, key):
-        if self.job.template.parameters[key].system:
+        if self._getIndex().get(key, UNDEFINED).system:
             return True
         if key in self.localConf:
             return True
@@ -375,6 +629,7 @@ class JobConf(object):
 
     def update(self, data):
         self.localConf.update(data)
+        self.invalidate()
 
     def get(self, key, default=None):
         c = self._get_conf(key)
@@ -386,20 +641,23 @@ class JobConf(object):
 
     def __getitem__(self, key):
         v = ''
-        c = self._get_conf(key)
+        info = self._getIndex().get(key, UNDEFINED)
+        if info.recursive:
+            c = self.jobConf
+        else:
+            c = self.localConf
         if key in c:
             v = c[key]
-        elif (key in self.job.template.parameters and
-              'default' in self.job.template.parameters[key]):
-            v = self.job.template.parameters[key].default
+        elif info.hasDefault:
+            v = info.default
 
-        if (key in self.job.template.parameters and
-                'callback' in self.job.template.parameters[key]):
-            v = self.job.template.parameters[key].callback(key, v)
+        if info.callback is not None:
+            v = info.callback(key, v)
         return v
 
     def __delitem__(self, key):
         del(self.localConf[key])
+        self.invalidate()
 
     def __setitem__(self, key, value):
         if key in self.job.template.parameters.keys():
@@ -422,6 +680,7 @@ class JobConf(object):
 
         self.jobConf[key] = value
         self.localConf[key] = value
+        self.invalidate()
 
     def __setattr__(self, key, value):
         if (key[0] == '_' or
@@ -21,26 +21,96 @@ import moa.utils
 import moa.logger as l
 
 import jinja2
+import jinja2.utils
 
 from moa.sysConf import sysConf
 
 ## Jinja2 related functionality
-        
+
+#: number of compiled string templates kept per environment
+TEMPLATECACHESIZE = 1000
+
+#: process wide jinja2 environments, keyed on (strict, extensions)
+_ENVS = {}
+
+_BYTECODECACHE = []
+
+
+class MoaEnvironment(jinja2.Environment):
+    """
+    Jinja2 environment that keeps the most recently used templates
+    created by :meth:`from_string`, keyed on their source
+    """
+    def __init__(self, *args, **kwargs):
+        super(MoaEnvironment, self).__init__(*args, **kwargs)
+        self.stringCache = jinja2.utils.LRUCache(TEMPLATECACHESIZE)
+
+    def from_string(self, source, globals=None, template_class=None):
+        if (globals is not None or template_class is not None or
+                not isinstance(source, basestring)):
+            return super(MoaEnvironment, self).from_string(
+                source, globals, template_class)
+        template = self.stringCache.get(source)
+        if template is None:
+            template = super(MoaEnvironment, self).from_string(source)
+            self.stringCache[source] = template
+        return template
+
+
+def getBytecodeCache():
+    """
+    Return a jinja2 bytecode cache storing compiled (file based)
+    templates under the moa cache dir - or None if there is no cache
+    dir
+    """
+    if not _BYTECODECACHE:
+        cacheDir = moa.utils.getCacheDir()
+        bcc = None
+        if cacheDir:
+            jinjaCacheDir = os.path.join(cacheDir, 'jinja2')
+            try:
+                if not os.path.isdir(jinjaCacheDir):
+                    os.makedirs(jinjaCacheDir)
+                bcc = jinja2.FileSystemBytecodeCache(jinjaCacheDir)
+            except OSError:
+                l.debug("cannot create %s" % jinjaCacheDir)
+        _BYTECODECACHE.append(bcc)
+    return _BYTECODECACHE[0]
+
+
+def _getEnv(strict):
+    extensions = tuple(sysConf.jinja2.extensions or [])
+    key = (strict, extensions)
+    if not key in _ENVS:
+        kwargs = dict(
+            loader=jinja2.PackageLoader('moa', 'jinja2'),
+            extensions=list(extensions),
+            bytecode_cache=getBytecodeCache())
+        if strict:
+            kwargs['undefined'] = jinja2.StrictUndefined
+        _ENVS[key] = MoaEnvironment(**kwargs)
+    return _ENVS[key]
+
+
 def getEnv(refresh=False):
-    return jinja2.Environment(
-        loader=jinja2.PackageLoader('moa', 'jinja2'),
-        extensions = sysConf.jinja2.extensions,
-        )
+    """
+    Return the (shared) jinja environment
+    """
+    return _getEnv(False)
+
 
 def getStrictEnv(refresh=False):
     """
     Return a strict jinja environment that barfs at undefined
-    variables
+    variables (shared as well)
+
+    >>> env = getStrictEnv()
+    >>> assert(env is getStrictEnv())
+    >>> assert(env.from_string('{{ a }}') is env.from_string('{{ a }}'))
+    >>> env.from_string('{{ a }}').render(a=1)
+    u'1'
     """
-    return jinja2.Environment(
-        undefined=jinja2.StrictUndefined,
-        extensions = sysConf.jinja2.extensions,
-        loader=jinja2.PackageLoader('moa', 'jinja2'))
+    return _getEnv(True)
  
 
 def getTerminalSize():
@@ -107,7 +177,7 @@ def getMoaBase():
         MOABASE = '/usr/share/moa'
 
     #for depending scripts
-    os.putenv('MOABASE', MOABASE)
+    os.environ['MOABASE'] = MOABASE
     return MOABASE
 
 def moaDirOrExit(job):
@@ -0,0 +1,136 @@
+# Copyright 2009-2011 Mark Fiers
+# The New Zealand Institute for Plant & Food Research
+#
+# This file is part of Moa - http://github.com/mfiers/Moa
+#
+# Licensed under the GPL license (see 'COPYING')
+#
+"""
+moa.pathlist
+------------
+
+Compact, read only, storage of (large) lists of file names. Instead
+of a string per file, a :class:`PathList` stores a table of the
+(few) distinct directories, and, per file, the index of its directory
+& the offset of its base name in a single buffer. The path strings
+are only created when accessed.
+
+>>> files = PathList(['in/a.fq', 'in/b.fq', 'other/c.fq', 'd.fq'],
+...                  pattern='*/*.fq')
+>>> len(files)
+4
+>>> files[0], files[-1], files[1:3]
+('in/a.fq', 'd.fq', ['in/b.fq', 'other/c.fq'])
+>>> " ".join(files)
+'in/a.fq in/b.fq other/c.fq d.fq'
+>>> files == ['in/a.fq', 'in/b.fq', 'other/c.fq', 'd.fq']
+True
+>>> 'other/c.fq' in files, files.pattern
+(True, '*/*.fq')
+>>> files.dirs
+['in/', 'other/', '']
+"""
+
+import os
+import array
+import collections
+
+#: separates the base names in the buffer
+SEP = '\0'
+
+
+class PathList(collections.Sequence):
+    """
+    List like, read only, container of file names
+
+    :param paths: iterable with the file names
+    :param pattern: pattern the files were resolved from
+    :param context: directory the file names are relative to
+    """
+    def __init__(self, paths=[], pattern=None, context='.'):
+        self.pattern = pattern
+        self.context = context
+        self.resolved = True
+        self.dirs = []
+        self._dirIds = array.array('I')
+        self._offsets = array.array('L', [0])
+
+        dirIndex = {}
+        names = []
+        offset = 0
+        for path in paths:
+            head, sep, name = path.rpartition('/')
+            head += sep
+            dirId = dirIndex.get(head)
+            if dirId is None:
+                dirId = dirIndex[head] = len(self.dirs)
+                self.dirs.append(head)
+            self._dirIds.append(dirId)
+            names.append(name)
+            offset += len(name) + 1
+            self._offsets.append(offset)
+        self._names = SEP.join(names) + SEP
+
+    def _get(self, i):
+        return self.dirs[self._dirIds[i]] + \
+            self._names[self._offsets[i]:self._offsets[i + 1] - 1]
+
+    def __len__(self):
+        return len(self._dirIds)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._get(x) for x in xrange(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("PathList index out of range")
+        return self._get(i)
+
+    def __iter__(self):
+        dirs, dirIds = self.dirs, self._dirIds
+        names, offsets = self._names, self._offsets
+        for i in xrange(len(dirIds)):
+            yield dirs[dirIds[i]] + names[offsets[i]:offsets[i + 1] - 1]
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, tuple, PathList)):
+            return False
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def absolute(self):
+        """
+        Return a list with the absolute paths of all files
+        """
+        return [os.path.abspath(os.path.join(self.context, x))
+                for x in self]
+
+
+def compact(files):
+    """
+    Convert a (resolved) fist fileset to a :class:`PathList`
+    """
+    if isinstance(files, PathList):
+        return files
+    return PathList(files, pattern=getattr(files, 'pattern', None),
+                    context=getattr(files, 'context', '.'))
+
+
+def simple(data):
+    """
+    Convert (nested) Yaco objects to plain dicts & lists - like
+    `Yaco.simple`, but keeps :class:`PathList` objects as they are
+    """
+    if isinstance(data, PathList):
+        return data
+    if isinstance(data, dict):
+        return dict([(k, simple(v)) for k, v in data.items()])
+    if isinstance(data, list):
+        return [simple(x) for x in data]
+    return data
@@ -11,10 +11,11 @@ Handle Moa commands (i.e. anything that you can run as `moa COMMAND` on the
 commandline
 """
 
-import copy
 import moa.logger
+import moa.plugin.manifest
 import Yaco
 import sys
+import time
 
 l = moa.logger.getLogger(__name__)
 
@@ -25,9 +26,18 @@ class PluginHandler():
     def __init__(self, config):
         """
         Manage the plugins
+
+        Plugin modules are imported lazily - based on a (cached)
+        manifest of the hooks & commands that each plugin defines,
+        a module is only imported the first time one of its hooks or
+        commands is used.
         """
         self.config = config
         self.pluginList = self.getPluginOrder()
+        #: commands known from the manifest, but not loaded yet
+        self.lazyCommands = {}
+        #: (hook, plugin): (no calls, total time)
+        self.hookStats = {}
         self.initialize()
 
     def getPluginOrder(self):
@@ -39,28 +49,136 @@ class PluginHandler():
 
     def initialize(self):
         """
-        attempt to load the python modules for each plugin
+        Load the plugin manifest & register the commands defined by
+        the plugins
         """
+        from moa.sysConf import sysConf
 
-        ## do we have a python module??
         l.debug('Start plugin init')
-        successfully_loaded = []
         for plugin in self.pluginList:
-            l.debug("Loading plugin %s" % plugin)
             self.config[plugin] = Yaco.Yaco()
-            pyModule = self.config[plugin].module
-            try:
-                _m = __import__(pyModule, globals(), locals(), [plugin], -1)
-                self.config[plugin]['loaded_module'] = _m
-                successfully_loaded.append(pyModule)
-            except ImportError:
+            if not self.config[plugin]:
                 sys.stderr.write(
-                    "ERROR - Plugin %s is not (properly) installed\n" % plugin)
-                if '-v' in sys.argv or '-vv' in sys.argv:
-                    raise
-                else:
-                    sys.exit(-1)
-        l.debug("loaded module %s" % ", ".join(successfully_loaded))
+                    "ERROR - potential problem with plugin %s" % plugin)
+                sys.exit()
+
+        self.manifest = moa.plugin.manifest.load(
+            self.config, self.pluginList)
+
+        if self.manifest is None:
+            l.debug("(re)generating the plugin manifest")
+            self.manifest = {}
+            for plugin in self.pluginList:
+                module = self.loadPlugin(plugin)
+                self.manifest[plugin] = moa.plugin.manifest.describe(
+                    plugin, module, sysConf.commands)
+            moa.plugin.manifest.save(
+                self.config, self.pluginList, self.manifest)
+
+        self.buildHookTable()
+
+        for plugin in self.pluginList:
+            if self.isLoaded(plugin):
+                continue
+            for name, cinf in self.manifest[plugin]['commands'].items():
+                if name in sysConf.commands:
+                    continue
+                self.lazyCommands[name] = plugin
+                sysConf.commands[name] = dict(
+                    cinf, call=self._lazyCall(plugin, name))
+
+    def _lazyCall(self, plugin, name):
+        """
+        Return a function that loads the plugin before calling the
+        (now properly registered) command
+        """
+        def lazyCommand(job, args):
+            from moa.sysConf import sysConf
+            self.loadPlugin(plugin)
+            return sysConf.commands[name]['call'](job, args)
+        return lazyCommand
+
+    def isLoaded(self, plugin):
+        return 'loaded_module' in self.config[plugin]
+
+    def loadPlugin(self, plugin):
+        """
+        Import the python module for a plugin (if that did not happen
+        yet) & return it
+        """
+        if self.isLoaded(plugin):
+            return self.config[plugin]['loaded_module']
+
+        l.debug("Loading plugin %s" % plugin)
+        pyModule = self.config[plugin].module
+        try:
+            _m = __import__(pyModule, globals(), locals(), [plugin], -1)
+            self.config[plugin]['loaded_module'] = _m
+        except ImportError:
+            sys.stderr.write(
+                "ERROR - Plugin %s is not (properly) installed\n" % plugin)
+            if '-v' in sys.argv or '-vv' in sys.argv:
+                raise
+            else:
+                sys.exit(-1)
+
+        for name in [k for k, v in self.lazyCommands.items()
+                     if v == plugin]:
+            del self.lazyCommands[name]
+
+        l.debug("loaded module %s" % pyModule)
+        return _m
+
+    def loadCommand(self, command):
+        """
+        Make sure that the plugin defining this command is loaded
+        """
+        if command in self.lazyCommands:
+            self.loadPlugin(self.lazyCommands[command])
+
+    def loadAll(self):
+        """
+        Load all plugins - for example, when the full command list
+        is required
+        """
+        for plugin in self.pluginList:
+            self.loadPlugin(plugin)
+
+    def buildHookTable(self):
+        """
+        Create the hook dispatch table: for each hook, the (ordered)
+        list of plugins that define it. The plugin functions are bound
+        the first time a hook fires (see :meth:`getHooks`).
+        """
+        self.hookTable = {}
+        for plugin in self.pluginList:
+            for hook in self.manifest[plugin]['hooks']:
+                self.hookTable.setdefault(hook[5:], []).append(plugin)
+        self.boundHooks = {}
+        self.boundHooksReversed = {}
+
+    def getHooks(self, command, reverse=False):
+        """
+        Return a list of (plugin, function) tuples implementing this
+        hook, in execution order
+        """
+        if reverse:
+            bound = self.boundHooksReversed
+        else:
+            bound = self.boundHooks
+
+        hooks = bound.get(command)
+        if hooks is not None:
+            return hooks
+
+        hooks = []
+        for plugin in self.hookTable.get(command, []):
+            module = self.loadPlugin(plugin)
+            hooks.append((plugin, getattr(module, 'hook_' + command)))
+
+        self.boundHooks[command] = hooks
+        self.boundHooksReversed[command] = list(reversed(hooks))
+        return bound[command]
 
     def run(self, command, reverse=False, only=[], **kwargs):
         """
@@ -71,27 +189,18 @@ class PluginHandler():
         :param **kwargs: pass these parameters on to the plugin function
         """
         rv = {}
-        runOrder = copy.copy(self.pluginList)
-        if reverse:
-            runOrder.reverse()
+        hooks = self.getHooks(command, reverse)
+        if not hooks:
+            return rv
 
         executed_in = []
-        for p in runOrder:
+        for p, hook in hooks:
             if only and not p in only:
                 continue
 
-            plugin_info = self.config[p]
-            if not plugin_info:
-                sys.stderr.write(
-                    "ERROR - potential problem with plugin %s" % p)
-                sys.exit()
-
-            m = plugin_info['loaded_module']
-
-            if not 'hook_' + command in m.__dict__:
-                continue
-
-            rv[p] = getattr(m, "hook_" + command)(**kwargs)
+            start = time.time()
+            rv[p] = hook(**kwargs)
+            self._countHook(command, p, time.time() - start)
             executed_in.append(p)
 
         if len(executed_in) > 0:
@@ -99,6 +208,23 @@ class PluginHandler():
                 command, ", ".join(executed_in)))
         return rv
 
+    def _countHook(self, command, plugin, runtime):
+        key = (command, plugin)
+        if key in self.hookStats:
+            calls, total = self.hookStats[key]
+            self.hookStats[key] = (calls + 1, total + runtime)
+        else:
+            self.hookStats[key] = (1, runtime)
+
+    def getHookStats(self):
+        """
+        Return a list of (hook, plugin, no calls, total seconds) for all
+        hooks that have fired, sorted by the total time spent
+        """
+        rv = [(k[0], k[1], v[0], v[1])
+              for k, v in self.hookStats.items()]
+        return sorted(rv, key=lambda x: -x[3])
+
     def execute(self, command):
         """
         Run a command callback
@@ -18,6 +18,7 @@ import tempfile
 
 
 import jinja2
+import moa.pathlist
 import moa.logger
 import moa.ui
 from moa.sysConf import sysConf
@@ -177,7 +178,7 @@ def openlavaRunner(wd, cl, conf={}, **kwargs):
         if ' ' in outk:
             continue
 
-        if isinstance(v, list):
+        if isinstance(v, (list, moa.pathlist.PathList)):
             s("%s='%s'" % (outk, " ".join(v)))
         elif isinstance(v, dict):
             continue
@@ -18,6 +18,7 @@ import tempfile
 
 
 import jinja2
+import moa.pathlist
 import moa.logger
 import moa.ui
 from moa.sysConf import sysConf
@@ -139,7 +140,7 @@ def _prep_parallel_script(wd, conf, job_file, prepare_script=None,
             continue
 
         # reformat lists
-        if isinstance(v, list):
+        if isinstance(v, (list, moa.pathlist.PathList)):
             s("%s='%s'" % (outk, " ".join(v)))
         elif isinstance(v, dict):
             continue
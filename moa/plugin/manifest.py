@@ -0,0 +1,170 @@
+# Copyright 2009-2011 Mark Fiers
+# The New Zealand Institute for Plant & Food Research
+#
+# This file is part of Moa - http://github.com/mfiers/Moa
+#
+# Licensed under the GPL license (see 'COPYING')
+#
+"""
+moa.plugin.manifest
+-------------------
+
+Keep track of which hooks & commands each plugin defines, without
+having to import the plugin modules.
+
+The manifest is cached in the Moa cache directory and regenerated
+(which means: importing all plugin modules once) when the plugin
+configuration or the mtime/size of any of the plugin modules changes.
+"""
+
+import hashlib
+import imp
+import json
+import os
+
+import moa.logger
+import moa.utils
+
+l = moa.logger.getLogger(__name__)
+
+#: command properties that are stored in the manifest
+COMMAND_FIELDS = ['desc', 'long', 'needsJob', 'private',
+                  'logJob', 'recursive']
+
+#: manifests already loaded in this process, by cache file name
+_LOADED = {}
+
+
+def moduleFile(moduleName):
+    """
+    Find the source file of a module without importing it (the parent
+    package does get imported)
+
+    >>> moduleFile('moa.plugin.manifest').rstrip('c').endswith('manifest.py')
+    True
+    >>> moduleFile('moa.plugin.doesnotexist') is None
+    True
+    """
+    package, _, name = moduleName.rpartition('.')
+    path = None
+    if package:
+        try:
+            parent = __import__(package, globals(), locals(), [name], -1)
+        except ImportError:
+            return None
+        path = getattr(parent, '__path__', None)
+    try:
+        F, pathname, description = imp.find_module(name, path)
+    except ImportError:
+        return None
+    if F:
+        F.close()
+    if description[2] == imp.PKG_DIRECTORY:
+        pathname = os.path.join(pathname, '__init__.py')
+    return pathname
+
+
+def _pluginConfig(config, plugin):
+    """
+    Return the configuration of a plugin as a plain dict (minus the
+    loaded module)
+    """
+    return dict([(k, v) for k, v in config[plugin].items()
+                 if k != 'loaded_module'])
+
+
+def signature(config, pluginList):
+    """
+    Determine the signature of a plugin configuration - this changes
+    when the configuration or any of the plugin modules changes
+    """
+    rv = []
+    for plugin in pluginList:
+        moduleName = config[plugin].module
+        fileName = moduleFile(moduleName)
+        try:
+            st = os.stat(fileName)
+            stamp = [st.st_mtime, st.st_size]
+        except (OSError, TypeError):
+            stamp = None
+        rv.append([plugin, moduleName, fileName, stamp,
+                   _pluginConfig(config, plugin)])
+    return hashlib.md5(
+        json.dumps(rv, sort_keys=True, default=str)).hexdigest()
+
+
+def cacheFile(config, pluginList):
+    """
+    Return the file name of the manifest cache for this set of plugins
+    """
+    cacheDir = moa.utils.getCacheDir()
+    if cacheDir is None:
+        return None
+    uid = hashlib.md5(" ".join(
+        ["%s=%s" % (p, config[p].module) for p in pluginList])).hexdigest()
+    return os.path.join(cacheDir, 'plugins.%s.json' % uid)
+
+
+def describe(plugin, module, commands):
+    """
+    Create the manifest entry for a loaded plugin module
+
+    :param commands: the current sysConf.commands
+    """
+    hooks = sorted([k for k, v in module.__dict__.items()
+                    if k[:5] == 'hook_' and callable(v)])
+    rvc = {}
+    for name in commands.keys():
+        call = commands[name].get('call')
+        if getattr(call, '__module__', None) != module.__name__:
+            continue
+        rvc[name] = dict([(k, commands[name].get(k))
+                          for k in COMMAND_FIELDS])
+    return {'module': module.__name__,
+            'hooks': hooks,
+            'commands': rvc}
+
+
+def load(config, pluginList):
+    """
+    Load the manifest for these plugins from cache. Returns None if
+    there is no valid cached manifest.
+    """
+    cfile = cacheFile(config, pluginList)
+    sig = signature(config, pluginList)
+    if cfile in _LOADED and _LOADED[cfile]['signature'] == sig:
+        return _LOADED[cfile]['plugins']
+
+    if cfile is None or not os.path.exists(cfile):
+        return None
+
+    try:
+        with open(cfile) as F:
+            data = json.load(F)
+    except (IOError, ValueError):
+        l.debug("invalid plugin manifest %s" % cfile)
+        return None
+
+    if data.get('signature') != sig:
+        l.debug("plugin manifest %s is out of date" % cfile)
+        return None
+
+    if set(data['plugins'].keys()) != set(pluginList):
+        return None
+
+    _LOADED[cfile] = data
+    return data['plugins']
+
+
+def save(config, pluginList, plugins):
+    """
+    Save the manifest for these plugins
+    """
+    data = {'signature': signature(config, pluginList),
+            'plugins': plugins}
+    cfile = cacheFile(config, pluginList)
+    _LOADED[cfile] = data
+    if cfile is None:
+        return
+    l.debug("saving plugin manifest %s" % cfile)
+    moa.utils.atomicWrite(cfile, json.dumps(data, default=str))
@@ -13,8 +13,10 @@ Allow execution of a bash oneline before & after job completion
 """
 
 import os
+import subprocess
 import moa.logger as l
 import moa.ui
+import moa.actor
 import jinja2
 
 from moa.sysConf import sysConf
@@ -72,16 +74,9 @@ def precommand(job, args):
 
 def executeExtraCommand(command, job):
     jobData = job.conf
-    for k in job.conf.keys():
-        v = job.conf[k]
-        if isinstance(v, list):
-            os.putenv(k, " ".join(v))
-        elif isinstance(v, dict):
-            continue
-        else:
-            os.putenv(k, str(v))
     template = jinja2.Template(command)
-    os.system(template.render(jobData))
+    subprocess.call(template.render(jobData), shell=True,
+                    env=moa.actor.taskEnv(jobData, job.wd))
 
 
 def hook_preRun():
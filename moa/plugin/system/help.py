@@ -20,6 +20,7 @@ import subprocess as sp
 import jinja2
 
 import moa.job
+import moa.moajinja
 import moa.utils
 import moa.template
 import moa.plugin
@@ -86,7 +87,8 @@ def help(job, args):
 
     global JENV
     JENV = jinja2.Environment(loader=jinja2.FileSystemLoader(
-        os.path.join(MOABASE, 'lib', 'jinja2')))
+        os.path.join(MOABASE, 'lib', 'jinja2')),
+        bytecode_cache=moa.moajinja.getBytecodeCache())
 
     jinjaTemplate = JENV.get_template('template.help.jinja2')
     pager(jinjaTemplate, template)
@@ -0,0 +1,81 @@
+# Copyright 2009-2011 Mark Fiers
+# The New Zealand Institute for Plant & Food Research
+#
+# This file is part of Moa - http://github.com/mfiers/Moa
+#
+# Licensed under the GPL license (see 'COPYING')
+#
+"""
+**plan** - show what a run would do
+-----------------------------------
+"""
+
+import json
+
+import moa.ui
+import moa.args
+import moa.logger
+from moa.sysConf import sysConf
+
+l = moa.logger.getLogger(__name__)
+
+
+def _niceBytes(n):
+    for unit in ['b', 'Kb', 'Mb', 'Gb']:
+        if n < 1024:
+            return "%d%s" % (n, unit)
+        n /= 1024.0
+    return "%.1fTb" % n
+
+
+@moa.args.needsJob
+@moa.args.doNotLog
+@moa.args.argument('planCommand', nargs='?', default='run',
+                   metavar='command',
+                   help='command to plan (default: run)')
+@moa.args.argument('--uptodate', choices=['mtime', 'hash'],
+                   help="Decide what to rerun on file timestamps (mtime) " +
+                   "or on content digests (hash) - default: the " +
+                   "'uptodate' configuration setting")
+@moa.args.argument('-n', '--no_items', type=int, default=10,
+                   help='No out of date items to show (default 10)')
+@moa.args.addFlag('-a', '--all', help='Show all items')
+@moa.args.addFlag('--json', help='Print the plan as JSON')
+@moa.args.command
+def plan(job, args):
+    """
+    Show which items of a map or reduce command would run
+
+    Determine, without executing anything, for each item of the
+    command if it is up to date, or why not (missing output, older
+    than an input or prerequisite, changed input or script).
+    """
+    if job.template.backend != 'ruff':
+        moa.ui.exitError("Can only plan jobs with the ruff backend")
+
+    import moa.backend.ruff.plan
+    rv = moa.backend.ruff.plan.plan(job, args.planCommand, args)
+
+    if args.json:
+        print json.dumps(rv, indent=1)
+        return
+
+    moa.ui.fprint("{{bold}}%s{{reset}} (%s): %d of %d items to run" % (
+        args.planCommand, rv['mode'], rv['to_run'], rv['total']), f='jinja')
+    for state in sorted(rv['summary']):
+        summary = rv['summary'][state]
+        moa.ui.fprint("  %-25s %8d items %10s" % (
+            state, summary['items'], _niceBytes(summary['input_bytes'])),
+            f='jinja')
+
+    shown = 0
+    for item in rv['items']:
+        if item['state'] == moa.backend.ruff.plan.UPTODATE:
+            continue
+        if not args.all and shown >= args.no_items:
+            moa.ui.fprint("  ...", f='jinja')
+            break
+        shown += 1
+        moa.ui.fprint("  {{red}}%-25s{{reset}} %s" % (
+            item['state'], " ".join(item['outputs'] or item['inputs'])),
+            f='jinja')
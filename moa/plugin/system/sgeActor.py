@@ -18,6 +18,7 @@ import subprocess
 
 from moa.sysConf import sysConf
 import moa.logger as l
+import moa.pathlist
 import moa.plugin.newjob
 
 def hook_defineOptions():
@@ -98,7 +99,7 @@ def sgeRunner(wd, cl, conf={}, **kwargs):
         # with 'moa_'
         outk = 'moa_' + k
         v = conf[k]
-        if isinstance(v, list):
+        if isinstance(v, (list, moa.pathlist.PathList)):
             os.putenv(outk, " ".join(v))
         elif isinstance(v, dict):
             continue
@@ -30,6 +30,10 @@ def hook_prepare_3():
         'type': 'string'
     }
 
+    # no need to render the configuration if nothing is to be injected
+    if not job.conf['var_inject']:
+        return
+
     renderedConf = job.conf.render()
     injectcommand = renderedConf.get('var_inject', '')
 
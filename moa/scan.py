@@ -0,0 +1,232 @@
+# Copyright 2009-2011 Mark Fiers
+# The New Zealand Institute for Plant & Food Research
+#
+# This file is part of Moa - http://github.com/mfiers/Moa
+#
+# Licensed under the GPL license (see 'COPYING')
+#
+"""
+moa.scan
+--------
+
+Fast expansion of fileset glob patterns. Each pattern component is
+compiled to a regular expression once; the directories at each level
+of a pattern (i.e. all subdirectories matching `*` in `*/*.fq`) are
+listed concurrently by a pool of threads - which is only started when
+more than one directory needs listing. If the `scandir` module is
+installed, the file type reported by the directory listing is used
+to find subdirectories without a stat per entry.
+
+Besides the matching files, a scan returns the modification times of
+all directories it looked at - as long as these do not change, the
+outcome of the scan does not change either.
+
+>>> import tempfile
+>>> d = tempfile.mkdtemp()
+>>> for sub in ['a', 'b', '.c']:
+...     os.mkdir(os.path.join(d, sub))
+...     for f in ['1.fq', '2.fq', '3.txt']:
+...         open(os.path.join(d, sub, f), 'w').close()
+>>> files, stamps = scan('*/*.fq', d)
+>>> files
+['a/1.fq', 'a/2.fq', 'b/1.fq', 'b/2.fq']
+>>> len(stamps)
+3
+>>> scan('a/1.fq b/3.txt', d)[0]
+['a/1.fq', 'b/3.txt']
+>>> scan('x/*.fq', d) == ([], [(d, os.stat(d).st_mtime)])
+True
+>>> pattern = os.path.join(d, '*', '.*')
+>>> scan(pattern, threads=1)[0] == sorted(glob.glob(pattern))
+True
+>>> canScan('{a,b}/*.fq')
+False
+"""
+
+import os
+import re
+import glob
+import fnmatch
+import multiprocessing.pool
+
+try:
+    import scandir
+except ImportError:
+    scandir = None
+
+import moa.logger
+l = moa.logger.getLogger(__name__)
+
+#: default number of threads used to list directories
+THREADS = 8
+
+#: characters that make a pattern component a glob
+GLOBCHARS = re.compile(r'[*?\[]')
+
+
+def canScan(pattern):
+    """
+    Check if all parts of a (space separated) pattern are plain globs
+    that the scanner understands
+    """
+    for part in str(pattern).split():
+        if part[:1] == '~' or '{' in part or '**' in part:
+            return False
+    return True
+
+
+def _compile(part):
+    """
+    Split a glob pattern into components - (name, None) for a literal
+    name or (glob, compiled regular expression)
+    """
+    rv = []
+    for comp in part.split('/'):
+        if GLOBCHARS.search(comp):
+            rv.append((comp, re.compile(fnmatch.translate(comp))))
+        else:
+            rv.append((comp, None))
+    return rv
+
+
+def _listDir(path):
+    """
+    List a directory - returns the dir's mtime, a list of names & the
+    set of names that are directories (None if unknown without a stat
+    per entry)
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None, [], set()
+
+    try:
+        if scandir is not None:
+            names = []
+            dirs = set()
+            for entry in scandir.scandir(path):
+                names.append(entry.name)
+                if entry.is_dir():
+                    dirs.add(entry.name)
+            return mtime, names, dirs
+        return mtime, os.listdir(path), None
+    except OSError:
+        return mtime, [], set()
+
+
+def _join(prefix, name):
+    if not prefix:
+        return name
+    return os.path.join(prefix, name)
+
+
+class _LazyPool(object):
+    """
+    Thread pool that is only started when it is first used
+    """
+    def __init__(self, threads):
+        self.threads = threads
+        self.pool = None
+
+    def map(self, function, items):
+        if self.pool is None:
+            self.pool = multiprocessing.pool.ThreadPool(self.threads)
+        return self.pool.map(function, items)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+
+def scanPart(part, context='.', pool=None):
+    """
+    Expand a single glob pattern - returns a list of matches & a list
+    of (directory, mtime) tuples
+    """
+    components = _compile(part)
+    prefixes = ['']
+    if components[0][0] == '':
+        # absolute path
+        prefixes = ['/']
+        components = components[1:]
+    stamps = []
+
+    for level, (comp, regex) in enumerate(components):
+        last = level == len(components) - 1
+        if not comp:
+            #double or trailing slash
+            continue
+
+        if regex is None:
+            # literal name - no need to list the directory, but
+            # whether the name exists depends on its parent
+            newPrefixes = []
+            for prefix in prefixes:
+                path = _join(prefix, comp)
+                full = os.path.join(context, path)
+                parent = os.path.normpath(os.path.join(context, prefix))
+                try:
+                    stamps.append((parent, os.stat(parent).st_mtime))
+                except OSError:
+                    stamps.append((parent, None))
+                if last:
+                    if os.path.lexists(full):
+                        newPrefixes.append(path)
+                elif os.path.isdir(full):
+                    newPrefixes.append(path)
+            prefixes = newPrefixes
+            continue
+
+        dirs = [os.path.normpath(os.path.join(context, x))
+                for x in prefixes]
+        if pool is not None and len(dirs) > 1:
+            listings = pool.map(_listDir, dirs)
+        else:
+            listings = [_listDir(x) for x in dirs]
+
+        # like glob: only match hidden files if asked for explicitly
+        hidden = comp[0] == '.'
+        newPrefixes = []
+        for prefix, path, (mtime, names, subDirs) in \
+                zip(prefixes, dirs, listings):
+            stamps.append((path, mtime))
+            names = filter(regex.match, names)
+            if not hidden:
+                names = [x for x in names if x[0] != '.']
+            if not last:
+                if subDirs is None:
+                    names = [x for x in names
+                             if os.path.isdir(os.path.join(path, x))]
+                else:
+                    names = [x for x in names if x in subDirs]
+            if prefix:
+                names = [os.path.join(prefix, x) for x in names]
+            newPrefixes.extend(names)
+        prefixes = newPrefixes
+
+    return sorted(prefixes), stamps
+
+
+def scan(pattern, context='.', threads=THREADS):
+    """
+    Expand a (space separated list of) glob pattern(s) relative to
+    `context`. Returns the list of matching files & a list of
+    (directory, mtime) tuples of the directories that were looked at.
+    """
+    pool = None
+    if threads > 1:
+        pool = _LazyPool(threads)
+    try:
+        files = []
+        stamps = []
+        for part in str(pattern).split():
+            partFiles, partStamps = scanPart(part, context, pool)
+            files.extend(partFiles)
+            stamps.extend(partStamps)
+    finally:
+        if pool is not None:
+            pool.close()
+    l.debug("scanned %s: %d files in %d dirs" % (
+        pattern, len(files), len(stamps)))
+    return files, stamps
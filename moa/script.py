@@ -3,20 +3,67 @@ Moa script helper
 """
 
 import os
+import re
 import yaml
 
-def getArgs():
-    if not os.path.exists('.moa/template'):
+#: name of the file in which moa passes a value too large for the
+#: environment (see :func:`moa.actor.envVars`)
+VALUEFILE = re.compile(r'^env\.[0-9a-f]{40}$')
+
+
+def _readValueFile(path):
+    """
+    Return the contents of a file in which moa passed a value - or
+    None if `path` is not such a file
+    """
+    if not VALUEFILE.match(os.path.basename(path)):
+        return None
+    try:
+        with open(path) as F:
+            return F.read()
+    except IOError:
+        return None
+
+
+def getArgs(wd='.', environ=None):
+    """
+    Return the job parameters passed to a script (as `moa_*`
+    environment variables) - fileset file lists are split. Values too
+    large for the environment are read from the file passed in
+    `moa_<name>_file`
+
+    >>> import tempfile
+    >>> d = tempfile.mkdtemp()
+    >>> os.makedirs(os.path.join(d, '.moa', 'tmp'))
+    >>> open(os.path.join(d, '.moa', 'template'), 'w').write(
+    ...     'filesets: {input: {}}')
+    >>> valueFile = os.path.join(d, '.moa', 'tmp', 'env.' + '0' * 40)
+    >>> open(valueFile, 'w').write('a.fq\\nb.fq\\n')
+    >>> args = getArgs(d, {'moa_input_files_file': valueFile,
+    ...                    'moa_title': 't', 'moa_db_file': 'x.db'})
+    >>> args == {'input_files': ['a.fq', 'b.fq'], 'title': 't',
+    ...          'db_file': 'x.db'}
+    True
+    """
+    if environ is None:
+        environ = os.environ
+    templateFile = os.path.join(wd, '.moa', 'template')
+    if not os.path.exists(templateFile):
         return {}
-    with open('.moa/template') as F:
+    with open(templateFile) as F:
         templateData = yaml.load(F)
     filesets = templateData.get('filesets', {}).keys()
 
     rv = {}
-    for a in os.environ.keys():
+    for a in environ.keys():
         if a[:4] != 'moa_': continue
         ky = a[4:]
-        va = os.environ[a]
+        va = environ[a]
+        if ky[-5:] == '_file' and not 'moa_' + ky[:-5] in environ:
+            value = _readValueFile(va)
+            if value is not None:
+                ky = ky[:-5]
+                va = value
         if '_files' in ky and ky[:-6] in filesets:
             va = va.split()
 
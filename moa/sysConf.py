@@ -13,6 +13,7 @@ Store Moa wide configuration
 
 """
 
+import cPickle
 import os
 import warnings
 
@@ -25,6 +26,8 @@ import Yaco
 
 import moa.logger
 import moa.plugin
+import moa.timer
+import moa.utils
 
 l = moa.logger.getLogger(__name__)
 sysConf = None
@@ -36,6 +39,13 @@ USERCONFIGFILE = os.path.join(os.path.expanduser('~'),
 #system wide configuration file: /etc/moa/config
 SYSCONFIGFILE = os.path.join('etc', 'moa', 'config')
 
+#package default configuration file
+PACKAGECONFIGFILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'etc', 'config')
+
+#change this when the snapshot format changes
+SNAPSHOTVERSION = 1
+
 def _interpret_var(v):
     try:
         return int(v)
@@ -54,9 +64,42 @@ def _interpret_var(v):
     return '"%s"' % v
 
 
+def _fileStamp(fileName):
+    try:
+        st = os.stat(fileName)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
+def _snapshotFile():
+    cacheDir = moa.utils.getCacheDir()
+    if cacheDir is None:
+        return None
+    return os.path.join(cacheDir, 'sysconf.pickle')
+
+
+def _snapshotKey(envVars):
+    """
+    Return the key identifying a configuration snapshot: the state of
+    the three configuration files & the relevant environment variables
+    """
+    return (SNAPSHOTVERSION,
+            [(f, _fileStamp(f)) for f in
+             [PACKAGECONFIGFILE, SYSCONFIGFILE, USERCONFIGFILE]],
+            [(k, os.environ.get(k)) for k in sorted(envVars)])
+
+
 class SysConf(Yaco.Yaco):
 
     def __init__(self):
+        #see if there is a valid snapshot of the merged configuration
+        snapshot = self.loadSnapshot()
+        if snapshot is not None:
+            l.debug("loading configuration snapshot")
+            super(SysConf, self).__init__(snapshot)
+            return
+
         #first load the package default
         l.debug("loading package configuration file")
         super(SysConf, self).__init__(
@@ -82,6 +125,51 @@ class SysConf(Yaco.Yaco):
             lri = 1
 
         #finally, map environment variables on top of config
+        self.loadEnviron()
+
+        self.saveSnapshot()
+
+    def loadSnapshot(self):
+        """
+        Return the merged configuration from the snapshot - or None if
+        there is no (valid) snapshot
+        """
+        snapshotFile = _snapshotFile()
+        if snapshotFile is None:
+            return None
+        try:
+            with open(snapshotFile, 'rb') as F:
+                envVars, key, data = cPickle.load(F)
+        except Exception:
+            return None
+
+        if key != _snapshotKey(envVars):
+            l.debug("configuration snapshot is out of date")
+            return None
+        return data
+
+    def saveSnapshot(self):
+        """
+        Store a snapshot of the merged configuration
+        """
+        snapshotFile = _snapshotFile()
+        if snapshotFile is None:
+            return
+
+        envVars = []
+        if self.has_key('environ'):
+            envVars = self.environ.keys()
+
+        data = cPickle.dumps(
+            (envVars, _snapshotKey(envVars), self.simple()),
+            cPickle.HIGHEST_PROTOCOL)
+        moa.utils.atomicWrite(snapshotFile, data)
+
+    def loadEnviron(self):
+        """
+        Map environment variables on top of the configuration (as
+        defined in the `environ` section)
+        """
         if self.has_key('environ'):
             for k, v in self.environ.items():
                 if not k in os.environ:
@@ -120,4 +208,5 @@ class SysConf(Yaco.Yaco):
 
 
 if sysConf is None:
-    sysConf = SysConf()
+    with moa.timer.phase('sysconf'):
+        sysConf = SysConf()
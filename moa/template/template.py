@@ -15,12 +15,114 @@ retrieving template information.
 """
 
 import os
+import cPickle
 
 import Yaco
 
 import moa.logger as l
+import moa.utils
 import moa.template
 
+#: bump when the format of the compiled template cache changes
+CACHEVERSION = 1
+
+#: in process cache: template file -> (stat key, pickled template)
+_compiled = {}
+
+
+def _statKey(fileName):
+    """
+    Return a key that changes when the file changes
+    """
+    st = os.stat(fileName)
+    return (fileName, st.st_mtime, st.st_size, st.st_ino)
+
+
+def loadCompiled(templateFile, cacheFile):
+    """
+    Return the parsed template file as a pickled string - which can
+    be cheaply unpickled into a fresh copy as often as required.
+
+    The parsed template is cached (in `cacheFile`) and reused as long
+    as the mtime, size & inode of the template file stay the same.
+
+    >>> import moa.job
+    >>> job = moa.job.newTestJob(template='simple')
+    >>> tfile = os.path.join(job.confDir, 'template')
+    >>> cfile = os.path.join(job.confDir, 'template.cache')
+    >>> data = cPickle.loads(loadCompiled(tfile, cfile))
+    >>> assert(os.path.exists(cfile))
+    >>> assert(data == job.template.getRaw().simple())
+    """
+    key = _statKey(templateFile)
+    if templateFile in _compiled and _compiled[templateFile][0] == key:
+        return _compiled[templateFile][1]
+
+    blob = None
+    try:
+        with open(cacheFile, 'rb') as F:
+            version, cacheKey, cacheBlob = cPickle.load(F)
+        if version == CACHEVERSION and cacheKey == key:
+            blob = cacheBlob
+    except Exception:
+        #missing or corrupt cache - parse the template
+        pass
+
+    if blob is None:
+        l.debug("compiling template %s" % templateFile)
+        y = Yaco.Yaco()
+        y.load(templateFile)
+        blob = cPickle.dumps(y.simple(), cPickle.HIGHEST_PROTOCOL)
+        moa.utils.atomicWrite(cacheFile, cPickle.dumps(
+            (CACHEVERSION, key, blob), cPickle.HIGHEST_PROTOCOL))
+
+    _compiled[templateFile] = (key, blob)
+    return blob
+
+
+class Parameters(Yaco.Yaco):
+    """
+    The parameter definitions of a template - keeps track of when each
+    parameter was last (re)defined, so that cached renders of a job
+    configuration notice redefinitions
+
+    >>> p = Parameters()
+    >>> p.title = {'default': 'a'}
+    >>> p['title'] = {'default': 'b'}
+    >>> p.getVersion(), p.changedSince(1)
+    (2, ['title'])
+    """
+    def __init__(self):
+        self.__dict__['_version'] = 0
+        self.__dict__['_changed'] = {}
+        super(Parameters, self).__init__()
+
+    def _define(self, key):
+        self.__dict__['_version'] += 1
+        self._changed[key] = self._version
+
+    def __setitem__(self, key, value):
+        self._define(key)
+        super(Parameters, self).__setitem__(key, value)
+
+    def __setattr__(self, key, value):
+        if key[0] == '_':
+            super(Parameters, self).__setattr__(key, value)
+        else:
+            self[key] = value
+
+    def getVersion(self):
+        """
+        Return a number that changes whenever a parameter is defined
+        """
+        return self._version
+
+    def changedSince(self, version):
+        """
+        Return the names of the parameters (re)defined after `version`
+        """
+        return [k for k, v in self._changed.items() if v > version]
+
 
 class Template(Yaco.Yaco):
     """
@@ -49,6 +151,7 @@ class Template(Yaco.Yaco):
         templateFile2 = os.path.join(wd, '.moa', 'template')
 
         self.metaFile = os.path.join(wd, '.moa', 'template.meta')
+        self.cacheFile = os.path.join(wd, '.moa', 'template.cache')
         self.loadMeta()
 
         #l.critical(templateFile1)
@@ -104,13 +207,20 @@ class Template(Yaco.Yaco):
             self.parameters = {}
             self.original = {}
         else:
-            self.load(self.templateFile)
+            compiled = loadCompiled(self.templateFile, self.cacheFile)
+            self.update(cPickle.loads(compiled))
 
             #keep a copy of the original template
             original = Yaco.Yaco()
-            original.load(self.templateFile)
+            original.update(cPickle.loads(compiled))
             self.original = original
 
+        #track (re)definitions of parameters from now on
+        parameters = Parameters()
+        for k, v in self.parameters.items():
+            dict.__setitem__(parameters, k, v)
+        dict.__setitem__(self, 'parameters', parameters)
+
         l.debug("set template to %s, backend %s" % (self.name, self.backend))
         if not self.name == 'nojob' and not self.modification_date:
             self.modification_date = os.path.getmtime(self.templateFile)
@@ -137,7 +247,8 @@ class Template(Yaco.Yaco):
         >>> assert(raw.has_key('parameters'))
         """
         y = Yaco.Yaco()
-        y.load(self.templateFile)
+        y.update(cPickle.loads(
+            loadCompiled(self.templateFile, self.cacheFile)))
         return y
 
     def saveRaw(self, raw):
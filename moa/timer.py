@@ -0,0 +1,153 @@
+# Copyright 2009-2011 Mark Fiers
+# The New Zealand Institute for Plant & Food Research
+#
+# This file is part of Moa - http://github.com/mfiers/Moa
+#
+# Licensed under the GPL license (see 'COPYING')
+#
+"""
+moa.timer
+---------
+
+Lightweight wall clock timing of the phases of a Moa invocation (see
+`moa --timings`). Phases can be nested:
+
+>>> reset()
+>>> with phase('outer'):
+...     with phase('inner'):
+...         pass
+>>> [(x[0], x[1]) for x in PHASES]
+[('outer', 0), ('inner', 1)]
+>>> 'inner' in report()
+True
+"""
+
+import json
+import time
+
+#: time this module was imported - roughly the start of the process
+START = time.time()
+
+#: recorded phases: [name, depth, start, duration]
+PHASES = []
+
+#: event counters
+COUNTERS = {}
+
+_stack = []
+
+
+def reset():
+    """
+    Forget all recorded phases & restart the clock
+    """
+    global START
+    START = time.time()
+    del PHASES[:]
+    del _stack[:]
+    COUNTERS.clear()
+
+
+def start(name):
+    """
+    Start timing a phase
+    """
+    record = [name, len(_stack), time.time(), None]
+    PHASES.append(record)
+    _stack.append(record)
+
+
+def stop(name):
+    """
+    Stop timing a phase (and any unfinished phases nested in it)
+    """
+    now = time.time()
+    while _stack:
+        record = _stack.pop()
+        record[3] = now - record[2]
+        if record[0] == name:
+            break
+
+
+def count(name, n=1):
+    """
+    Count an event (reported with the phases)
+    """
+    COUNTERS[name] = COUNTERS.get(name, 0) + n
+
+
+class phase(object):
+    """
+    Time a phase - use as a context manager::
+
+        with moa.timer.phase('load_config'):
+            ...
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        start(self.name)
+        return self
+
+    def __exit__(self, *args):
+        stop(self.name)
+        return False
+
+
+def report(hookStats=[]):
+    """
+    Return a table with the recorded phases
+
+    :param hookStats: list of (hook, plugin, calls, seconds) as
+       returned by :meth:`moa.plugin.PluginHandler.getHookStats`
+    """
+    now = time.time()
+    rv = ["%-40s %10s" % ('phase', 'seconds')]
+    for name, depth, started, duration in PHASES:
+        if duration is None:
+            duration = now - started
+        rv.append("%-40s %10.4f" % ('  ' * depth + name, duration))
+
+    if COUNTERS:
+        rv.append("")
+        rv.append("%-40s %10s" % ('counter', 'count'))
+        for name in sorted(COUNTERS):
+            rv.append("%-40s %10d" % (name, COUNTERS[name]))
+
+    if hookStats:
+        rv.append("")
+        rv.append("%-40s %10s %7s" % ('hook', 'seconds', 'calls'))
+        for hook, plugin, calls, seconds in hookStats:
+            rv.append("%-40s %10.4f %7d" % (
+                "%s (%s)" % (hook, plugin), seconds, calls))
+
+    rv.append("")
+    rv.append("%-40s %10.4f" % ('total', now - START))
+    return "\n".join(rv)
+
+
+def toDict(hookStats=[]):
+    """
+    Return the recorded timings as a dict (for JSON serialization)
+    """
+    return {
+        'start': START,
+        'total': time.time() - START,
+        'phases': [{'phase': name, 'depth': depth, 'seconds': duration}
+                   for name, depth, started, duration in PHASES],
+        'counters': COUNTERS,
+        'hooks': [{'hook': hook, 'plugin': plugin, 'calls': calls,
+                   'seconds': seconds}
+                  for hook, plugin, calls, seconds in hookStats],
+    }
+
+
+def save(fileName, hookStats=[], **extra):
+    """
+    Append the recorded timings as a single line of JSON to a file
+    """
+    data = toDict(hookStats)
+    data.update(extra)
+    with open(fileName, 'a') as F:
+        F.write(json.dumps(data) + "\n")
@@ -126,6 +126,55 @@ def getCwd():
     return cwd
 
 
+def getCacheDir():
+    """
+    Return the directory where Moa caches data between invocations
+    (`$XDG_CACHE_HOME/moa`, defaulting to `~/.cache/moa`). The
+    directory is created if it does not exist. Returns None if that is
+    not possible.
+
+    >>> d = getCacheDir()
+    >>> assert(d is None or os.path.isdir(d))
+    """
+    base = os.environ.get('XDG_CACHE_HOME',
+                          os.path.join(os.path.expanduser('~'), '.cache'))
+    cacheDir = os.path.join(base, 'moa')
+    if not os.path.isdir(cacheDir):
+        try:
+            os.makedirs(cacheDir)
+        except OSError:
+            return None
+    return cacheDir
+
+
+def atomicWrite(fileName, data):
+    """
+    Write data to a file via a temporary file & a rename, so that
+    concurrent readers never see a partially written file. Returns
+    False if the file could not be written.
+
+    >>> import tempfile
+    >>> tf = os.path.join(tempfile.mkdtemp(), 'atomic')
+    >>> atomicWrite(tf, 'test')
+    True
+    >>> open(tf).read()
+    'test'
+    """
+    tmpName = '%s.%d.tmp' % (fileName, os.getpid())
+    try:
+        with open(tmpName, 'wb') as F:
+            F.write(data)
+        os.rename(tmpName, fileName)
+    except (IOError, OSError):
+        l.debug("could not write %s" % fileName)
+        try:
+            os.unlink(tmpName)
+        except OSError:
+            pass
+        return False
+    return True
+
+
 def getTerminalSize():
     def ioctl_GWINSZ(fd):
         try:
@@ -196,7 +245,7 @@ def getMoaBase():
         MOABASE = '/usr/share/moa'
 
     # for depending scripts
-    os.putenv('MOABASE', MOABASE)
+    os.environ['MOABASE'] = MOABASE
     return MOABASE
 
 
@@ -12,6 +12,8 @@ entry_points = {
         'moasetstatus = moa.cli.setstatus:setstatus',
         'moar = moa.cli.moar:moar',
         'moainit = moa.cli.moainit:moainit',
+        'moad = moa.cli.server:moad',
+        'moac = moa.cli.client:client',
     ]}
 
 requires = [
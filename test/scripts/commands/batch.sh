@@ -0,0 +1,37 @@
+#!/bin/bash
+
+set -e
+set -v
+
+export MOA_GIT_ENFORCE=False
+
+tmpdir=`mktemp -d -t moatest`
+cd $tmpdir
+echo "Running in $PWD"
+
+for x in 1 2 3 4 5; do
+   echo $x > test.$x
+done
+
+moa new map -t test
+moa set process="echo {{ output }}; cp {{input}} {{ output }}"
+moa set input="./test.*"  output="./out.*"
+
+output=`moa run --batch_size 2 2>&1`
+[[ "$output" =~ "out.5" ]] || (echo "invalid output 1" && false )
+[[ `cat out.3` == "3" ]] || (echo "invalid output 2" && false )
+
+# up to date is decided per item
+touch -d '+1 hour' test.2
+output=`moa run --batch_size 2 2>&1`
+[[ "$output" =~ "out.2" ]] || (echo "invalid output 3" && false )
+[[ ! "$output" =~ "out.3" ]] || (echo "invalid output 4" && false )
+
+# a failing item fails the batch - the other items still run
+rm out.*
+moa set process="test {{ input }} != ./test.2; cp {{input}} {{ output }}"
+if moa run --batch_size 5; then false; fi
+[[ ! -f out.2 ]] || (echo "invalid output 5" && false )
+[[ -f out.5 ]] || (echo "invalid output 6" && false )
+
+rm -rf $tmpdir
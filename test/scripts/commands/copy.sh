@@ -0,0 +1,36 @@
+#!/bin/bash
+
+set -e
+set -v
+
+export MOA_GIT_ENFORCE=False
+
+tmpdir=`mktemp -d -t moatest`
+cd $tmpdir
+echo "Running in $PWD"
+
+mkdir A
+cd A
+for x in 1 2 3; do
+   echo $x > test.$x
+done
+
+moa new map -t test
+moa set process="cp {{input}} {{ output }}"
+moa set input="./test.*"  output="./out.*"
+
+# make sure the fileset cache of A is trusted
+sleep 2
+moa plan
+[[ -f .moa/filesets.cache ]] || (echo "no fileset cache" && false )
+
+# a copy of the job does not use the fileset cache of A
+cd ..
+cp -a A B
+cd B
+echo 4 > test.4
+output=`moa plan`
+[[ "$output" =~ "4 of 4 items to run" ]] || (echo "invalid plan" && false )
+grep -q test.4 .moa/input.fof || (echo "invalid fof" && false )
+
+rm -rf $tmpdir
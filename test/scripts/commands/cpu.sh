@@ -0,0 +1,40 @@
+#!/bin/bash
+
+export MOA_GIT_ENFORCE=False
+
+set -e
+set -v
+
+tmpdir=`mktemp -d -t moatest`
+cd $tmpdir
+echo "Running in $PWD"
+
+# cpu ticks used by a process & all its (running) children
+ticks() {
+    local t=`awk '{print $14 + $15}' /proc/$1/stat 2>/dev/null || echo 0`
+    for c in `pgrep -P $1`; do
+        t=$(( t + `ticks $c` ))
+    done
+    echo $t
+}
+
+moa new simple -t cputest
+moa set process='echo start; sleep 30; echo done'
+moa run > run.out 2>&1 &
+pid=$!
+
+# moa should be (nearly) idle while waiting for the job
+sleep 5
+before=`ticks $pid`
+sleep 20
+after=`ticks $pid`
+used=$(( after - before ))
+echo "used $used ticks in 20 seconds"
+# less than 2% of a cpu
+[[ $used -lt $(( `getconf CLK_TCK` * 20 / 50 )) ]] || (echo "moa is busy" && false )
+
+wait $pid
+grep -q done run.out
+grep -q done .moa/log.latest/stdout
+
+rm -rf $tmpdir
@@ -0,0 +1,39 @@
+#!/bin/bash
+
+set -e
+set -v
+
+export MOA_GIT_ENFORCE=False
+
+tmpdir=`mktemp -d -t moatest`
+cd $tmpdir
+echo "Running in $PWD"
+
+for x in 1 2 3 4 5; do
+   echo $x > test.$x
+done
+
+moa new map -t test
+moa set process="echo {{ output }}; cp {{input}} {{ output }}"
+moa set input="./test.*"  output="./out.*"
+
+output=`moa run --executor native -j 2 2>&1`
+[[ "$output" =~ "out.5" ]] || (echo "invalid output 1" && false )
+[[ `cat out.3` == "3" ]] || (echo "invalid output 2" && false )
+
+# everything is up to date
+output=`moa run --executor native 2>&1`
+[[ ! "$output" =~ "out.1" ]] || (echo "invalid output 3" && false )
+
+# a newer input is processed again
+touch -d '+1 hour' test.2
+output=`moa run --executor native -j 2 2>&1`
+[[ "$output" =~ "out.2" ]] || (echo "invalid output 4" && false )
+[[ ! "$output" =~ "out.3" ]] || (echo "invalid output 5" && false )
+
+# a failing item fails the run
+moa set process="cp {{input}} {{ output }}; false"
+rm out.4
+if moa run --executor native -j 2; then false; fi
+
+rm -rf $tmpdir
@@ -0,0 +1,46 @@
+#!/bin/bash
+
+set -e
+set -v
+
+export MOA_GIT_ENFORCE=False
+
+tmpdir=`mktemp -d -t moatest`
+cd $tmpdir
+echo "Running in $PWD"
+
+for x in 1 2 3; do
+   echo $x > test.$x
+done
+
+moa new map -t test
+moa set process="cp {{input}} {{ output }}"
+moa set input="./test.*"  output="./out.*"
+
+output=`moa plan`
+[[ "$output" =~ "3 of 3 items to run" ]] || (echo "invalid plan 1" && false )
+[[ "$output" =~ "missing output" ]] || (echo "invalid plan 2" && false )
+
+moa run
+output=`moa plan`
+[[ "$output" =~ "0 of 3 items to run" ]] || (echo "invalid plan 3" && false )
+
+# a newer input
+touch -d '+1 hour' test.2
+output=`moa plan --json`
+[[ "$output" =~ "older than input" ]] || (echo "invalid plan 4" && false )
+[[ "$output" =~ '"to_run": 1' ]] || (echo "invalid plan 5" && false )
+
+# nothing was executed
+[[ `cat out.2` == "2" ]] || (echo "invalid output" && false )
+
+# like moa run, an input as old as its output needs to run
+touch -d '2020-01-01 00:00:00' test.* out.*
+touch -d '2020-01-01 00:00:01' out.1 out.2
+output=`moa plan`
+[[ "$output" =~ "1 of 3 items to run" ]] || (echo "invalid plan 6" && false )
+output=`moa run 2>&1`
+[[ "$output" =~ "out.3" ]] || (echo "invalid run" && false )
+[[ ! "$output" =~ "out.1" ]] || (echo "invalid run 2" && false )
+
+rm -rf $tmpdir
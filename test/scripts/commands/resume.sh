@@ -0,0 +1,35 @@
+#!/bin/bash
+
+set -e
+set -v
+
+export MOA_GIT_ENFORCE=False
+
+tmpdir=`mktemp -d -t moatest`
+cd $tmpdir
+echo "Running in $PWD"
+
+for x in 1 2 3 4; do
+   echo $x > test.$x
+done
+
+# a map job without output files
+moa new map -t test
+sed -i '/^  output:/,/type: map/d' .moa/template
+rm -f .moa/template.cache
+moa set process="[ -f stop ] && [ {{input}} == ./test.3 ] && exit 1; echo {{input}} >> ran"
+moa set input="./test.*"
+
+# the run stops at the third item
+touch stop
+moa run && (echo "run should fail" && false )
+[[ `cat ran | wc -l` == 2 ]] || (echo "invalid run 1" && false )
+
+# resuming only runs the items that did not finish
+rm stop
+moa run --resume
+[[ `grep -c test.1 ran` == 1 ]] || (echo "invalid resume 1" && false )
+grep -q test.3 ran || (echo "invalid resume 2" && false )
+grep -q test.4 ran || (echo "invalid resume 3" && false )
+
+rm -rf $tmpdir
@@ -0,0 +1,50 @@
+#!/bin/bash
+
+export MOA_GIT_ENFORCE=False
+
+set -e
+set -v
+
+tmpdir=`mktemp -d -t moatest`
+cd $tmpdir
+echo "Running in $PWD"
+
+export MOAD_SOCKET=$tmpdir/moad.socket
+moad --idle 60
+for i in `seq 1 50`; do
+    [[ -S $MOAD_SOCKET ]] && break
+    sleep 0.2
+done
+
+moac new simple -t servertest
+moac set process='echo "server run"'
+moa show | grep title | grep -q servertest
+[[ "`moac show`" == "`moa show`" ]]
+out=`moac run`
+[[ "$out" =~ "server run" ]]
+
+# non-ASCII (& non UTF-8) environment values & arguments arrive as is
+export MOA_TEST_UTF8=$'caf\xc3\xa9' MOA_TEST_BYTES=$'\xff\xfe'
+moac set process='printf "%s|%s" "$MOA_TEST_UTF8" "$MOA_TEST_BYTES" > env.out'
+moac run
+printf "%s|%s" "$MOA_TEST_UTF8" "$MOA_TEST_BYTES" | cmp - env.out
+[[ "`moac $'caf\xc3\xa9' 2>&1`" == "`moa $'caf\xc3\xa9' 2>&1`" ]]
+
+# return codes are passed on
+moac set process='false'
+! moac run
+
+# the server is not used if others can access its directory
+chmod 0755 $tmpdir
+out=`moac show 2>&1`
+[[ "$out" =~ "not using the moa server" ]]
+[[ "$out" =~ "servertest" ]]
+chmod 0700 $tmpdir
+
+# & the server refuses to use such a directory
+mkdir -m 0755 public
+MOAD_SOCKET=$tmpdir/public/socket moad && (echo "moad should refuse" && false)
+[[ ! -e public/socket ]]
+
+moad --stop
+rm -rf $tmpdir
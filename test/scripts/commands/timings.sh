@@ -0,0 +1,23 @@
+#!/bin/bash
+
+export MOA_GIT_ENFORCE=False
+
+set -e
+set -v
+
+tmpdir=`mktemp -d -t moatest`
+cd $tmpdir
+echo "Running in $PWD"
+
+moa new simple -t timingtest
+moa set process='echo "timed run"'
+
+# the report is written to stderr
+moa --timings 2>&1 >/dev/null | grep -q '^  template'
+moa show --timings 2>&1 >/dev/null | grep -q '^command'
+
+# and stored with the run
+moa run --timings 2>/dev/null
+grep -q '"phase": "load_config"' .moa/log.latest/timings.json
+
+rm -rf $tmpdir
@@ -0,0 +1,35 @@
+#!/bin/bash
+
+set -e
+set -v
+
+export MOA_GIT_ENFORCE=False
+
+tmpdir=`mktemp -d -t moatest`
+cd $tmpdir
+echo "Running in $PWD"
+
+for x in `seq -w 1 5`; do
+   echo $x > test.$x
+done
+
+moa new map -t test
+moa set process="echo {{ output }}; cp {{input}} {{ output }}"
+moa set input="./test.*"  output="./out.*"
+
+output=`moa run --uptodate hash 2>&1`
+[[ "$output" =~ "out.1" ]] || (echo "invalid output 1" && false )
+
+# touching does not change the contents - nothing to do
+touch test.*
+output=`moa run --uptodate hash 2>&1`
+[[ ! "$output" =~ "out.1" ]] || (echo "invalid output 2" && false )
+
+# a changed file is processed again, even with an old mtime
+echo changed > test.2
+touch -d '2000-01-01' test.2
+output=`moa run --uptodate hash 2>&1`
+[[ "$output" =~ "out.2" ]] || (echo "invalid output 3" && false )
+[[ ! "$output" =~ "out.3" ]] || (echo "invalid output 4" && false )
+
+rm -rf $tmpdir
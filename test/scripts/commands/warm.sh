@@ -0,0 +1,31 @@
+#!/bin/bash
+
+set -e
+set -v
+
+export MOA_GIT_ENFORCE=False
+
+tmpdir=`mktemp -d -t moatest`
+cd $tmpdir
+echo "Running in $PWD"
+
+for x in 1 2 3; do
+   echo $x > test.$x
+done
+
+moa new map -t test
+moa set process="echo \$moa_output value:\$LEAK; cp {{input}} {{ output }}; export LEAK=leak; cd /"
+moa set input="./test.*"  output="./out.*"
+
+# cwd & environment are reset between items
+output=`moa run --warm 2>&1`
+[[ "$output" =~ "out.3" ]] || (echo "invalid output 1" && false )
+[[ ! "$output" =~ "value:leak" ]] || (echo "invalid output 2" && false )
+[[ `cat out.2` == "2" ]] || (echo "invalid output 3" && false )
+
+# a failing item fails the run
+rm out.*
+moa set process="false"
+if moa run --warm -j 2; then false; fi
+
+rm -rf $tmpdir
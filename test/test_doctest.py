@@ -9,13 +9,45 @@ except ImportError:
 import doctest
 
 import moa.job
+import moa.actor
+import moa.cli.client
 import moa.utils
+import moa.script
+import moa.plugin.manifest
+import moa.timer
+import moa.jobConf
+import moa.scan
+import moa.backend.ruff.batch
+import moa.backend.ruff.commands
+import moa.backend.ruff.jobdata
+import moa.pathlist
+import moa.digest
+import moa.backend.ruff.journal
+import moa.backend.ruff.uptodate
+import moa.backend.ruff.native
+import moa.backend.ruff.plan
 import moa.template
 import moa.template.template
 
 def load_tests(loader, tests, ignore):
     tests.addTests(doctest.DocTestSuite(moa.job))
+    tests.addTests(doctest.DocTestSuite(moa.actor))
+    tests.addTests(doctest.DocTestSuite(moa.cli.client))
     tests.addTests(doctest.DocTestSuite(moa.utils))
+    tests.addTests(doctest.DocTestSuite(moa.script))
+    tests.addTests(doctest.DocTestSuite(moa.plugin.manifest))
+    tests.addTests(doctest.DocTestSuite(moa.timer))
+    tests.addTests(doctest.DocTestSuite(moa.jobConf))
+    tests.addTests(doctest.DocTestSuite(moa.scan))
+    tests.addTests(doctest.DocTestSuite(moa.backend.ruff.batch))
+    tests.addTests(doctest.DocTestSuite(moa.backend.ruff.commands))
+    tests.addTests(doctest.DocTestSuite(moa.backend.ruff.jobdata))
+    tests.addTests(doctest.DocTestSuite(moa.pathlist))
+    tests.addTests(doctest.DocTestSuite(moa.digest))
+    tests.addTests(doctest.DocTestSuite(moa.backend.ruff.journal))
+    tests.addTests(doctest.DocTestSuite(moa.backend.ruff.uptodate))
+    tests.addTests(doctest.DocTestSuite(moa.backend.ruff.native))
+    tests.addTests(doctest.DocTestSuite(moa.backend.ruff.plan))
     tests.addTests(doctest.DocTestSuite(moa.template))
     tests.addTests(doctest.DocTestSuite(moa.template.template))
     return tests
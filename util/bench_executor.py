@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Benchmark the dispatch overhead of running map items through ruffus
+against the native executor (:mod:`moa.backend.ruff.native`): every
+item runs a no-op function, so all time measured is scheduling,
+up-to-date checking & transport of the items to the workers
+
+usage: bench_executor.py [-n ITEMS] [-j PROCESSES] [-k KEYS]
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import ruffus
+
+import moa.backend.ruff.native
+from moa.backend.ruff.jobdata import SharedData, ItemData
+
+
+def noop(input, output, script, jobData, info=None):
+    pass
+
+
+def items(args, shared):
+    for i in xrange(args.items):
+        yield (['in/%08d.txt' % i], ['out/%08d.txt' % i], 'true',
+               ItemData(shared, {'input': 'in/%08d.txt' % i,
+                                 'output': 'out/%08d.txt' % i,
+                                 'runid': 'r%08d.moa' % i}),
+               {})
+
+
+def runRuffus(args, shared):
+    if hasattr(noop, 'pipeline_task'):
+        del noop.pipeline_task
+    task = ruffus.files(lambda: items(args, shared))(noop)
+    ruffus.pipeline_run([task], verbose=0, one_second_per_job=False,
+                        multiprocess=args.threads,
+                        logger=ruffus.black_hole_logger)
+
+
+def runNative(args, shared):
+    executor = moa.backend.ruff.native.NativeExecutor(
+        args.threads, function=noop)
+    executor.run(items(args, shared))
+
+
+def measure(name, run, args, shared):
+    start = time.time()
+    run(args, shared)
+    duration = time.time() - start
+    print "%-8s %6d items  %2d process(es)  %7.2f s  %7.1f us/item" % (
+        name, args.items, args.threads, duration,
+        1e6 * duration / args.items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', dest='items', type=int, default=10000,
+                        help='number of items')
+    parser.add_argument('-j', dest='threads', type=int, default=4,
+                        help='number of processes')
+    parser.add_argument('-k', dest='keys', type=int, default=1000,
+                        help='number of keys in the shared job data')
+    args = parser.parse_args()
+
+    wd = tempfile.mkdtemp()
+    os.chdir(wd)
+    os.mkdir('in')
+    for i in xrange(args.items):
+        open('in/%08d.txt' % i, 'w').close()
+    try:
+        shared = SharedData(dict([('key%d' % i, 'value %d' % i)
+                                  for i in range(args.keys)]))
+        shared.save(wd)
+        measure('ruffus', runRuffus, args, shared)
+        measure('native', runNative, args, shared)
+    finally:
+        shutil.rmtree(wd)
+
+
+if __name__ == '__main__':
+    main()
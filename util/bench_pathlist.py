@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Benchmark the memory used to hold a large fileset: a plain list of
+path strings against a :class:`moa.pathlist.PathList`
+
+usage: bench_pathlist.py [-n FILES] [-d DIRS]
+"""
+
+import os
+import time
+import argparse
+import cPickle
+
+import moa.pathlist
+
+
+def rss():
+    """
+    Resident set size of this process, in bytes
+    """
+    with open('/proc/self/statm') as F:
+        return int(F.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def paths(files, dirs):
+    for i in xrange(files):
+        yield '/data/project/sequencing/run%04d/sample_%08d_R1.fastq.gz' % (
+            i % dirs, i)
+
+
+def measure(name, build, args):
+    """
+    Build the container in a child process (for a clean measurement)
+    & report the memory used
+    """
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(rfd)
+        before = rss()
+        start = time.time()
+        container = build(paths(args.files, args.dirs))
+        duration = time.time() - start
+        used = rss() - before
+        start = time.time()
+        for x in container:
+            pass
+        iterate = time.time() - start
+        size = len(cPickle.dumps(container, cPickle.HIGHEST_PROTOCOL))
+        os.write(wfd, cPickle.dumps((used, duration, iterate, size)))
+        os._exit(0)
+    os.close(wfd)
+    data = ''
+    while True:
+        chunk = os.read(rfd, 4096)
+        if not chunk:
+            break
+        data += chunk
+    os.waitpid(pid, 0)
+    used, duration, iterate, size = cPickle.loads(data)
+    print "%-10s %8.1f MB  build %6.2f s  iterate %6.2f s  pickle %8.1f MB" % (
+        name, used / 1e6, duration, iterate, size / 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', dest='files', type=int, default=500000,
+                        help='number of files')
+    parser.add_argument('-d', dest='dirs', type=int, default=100,
+                        help='number of directories')
+    args = parser.parse_args()
+
+    measure('list', list, args)
+    measure('PathList', moa.pathlist.PathList, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Benchmark the per item cost of rendering a template command (as done
+for each item of a map job) with :class:`moa.backend.ruff.commands.RuffCommands`
+
+usage: bench_render.py [-n ITEMS] [-p PARAMETERS]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import jinja2
+
+import moa.backend.ruff.commands
+
+SCRIPT = """### run
+
+set -v
+
+{{ process }}
+
+### introspect
+
+{% for k in keys %}echo "{{ k }}={{ __moadata__[k] }}"
+{% endfor %}
+"""
+
+
+def naiveRender(script, data):
+    """
+    Render the way RuffCommands used to: compile on every call, copy
+    the data & always render twice
+    """
+    env = jinja2.Environment()
+    jt = env.from_string(script)
+    data['__moadata__'] = dict(data)
+    rscript = jt.render(data)
+    jt2 = env.from_string(rscript)
+    return jt2.render(data)
+
+
+def bench(name, func, items):
+    start = time.time()
+    for i in range(items):
+        func(i)
+    duration = time.time() - start
+    print "%-30s %8.1f us/item  (%d items, %.2f s)" % (
+        name, 1e6 * duration / items, items, duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', dest='items', type=int, default=20000,
+                        help='number of items to render')
+    parser.add_argument('-p', dest='parameters', type=int, default=60,
+                        help='number of job parameters')
+    args = parser.parse_args()
+
+    confDir = tempfile.mkdtemp()
+    try:
+        os.mkdir(os.path.join(confDir, 'template.d'))
+        with open(os.path.join(confDir, 'template.d', 'bench.jinja2'),
+                  'w') as F:
+            F.write(SCRIPT)
+        commands = moa.backend.ruff.commands.RuffCommands(confDir, 'bench')
+
+        base = dict([('par%03d' % i, 'value %d' % i)
+                     for i in range(args.parameters)])
+        base['process'] = 'cp {{ input }} {{ output }}'
+        base['keys'] = sorted(base.keys())[:5]
+
+        def itemData(i):
+            data = dict(base)
+            data['input'] = 'in/%06d.txt' % i
+            data['output'] = 'out/%06d.txt' % i
+            return data
+
+        script = commands['run']['script']
+        bench('naive (run)', lambda i: naiveRender(script, itemData(i)),
+              args.items)
+        bench('RuffCommands (run)',
+              lambda i: commands.render('run', itemData(i)), args.items)
+        bench('RuffCommands (introspect)',
+              lambda i: commands.render('introspect', itemData(i)),
+              args.items)
+    finally:
+        shutil.rmtree(confDir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Benchmark expanding a fileset glob pattern over a large directory
+tree: :func:`glob.glob` against :func:`moa.scan.scan`
+
+usage: bench_scan.py [-d DIRS] [-f FILES] [-t THREADS]
+"""
+
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+
+import moa.scan
+
+
+def bench(name, func, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        rv = func()
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    print "%-30s %8.3f s  (%d files)" % (name, best, len(rv))
+    return rv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-d', dest='dirs', type=int, default=100,
+                        help='number of directories')
+    parser.add_argument('-f', dest='files', type=int, default=2000,
+                        help='number of files per directory')
+    parser.add_argument('-t', dest='threads', type=int,
+                        default=moa.scan.THREADS,
+                        help='number of threads for the parallel scan')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        for d in range(args.dirs):
+            dirName = os.path.join(root, 'dir%04d' % d)
+            os.mkdir(dirName)
+            for f in range(args.files):
+                ext = ['fq', 'txt'][f % 2]
+                open(os.path.join(dirName, 'f%06d.%s' % (f, ext)),
+                     'w').close()
+
+        pattern = '*/*.fq'
+        cwd = os.getcwd()
+        os.chdir(root)
+        try:
+            expected = bench('glob.glob',
+                             lambda: sorted(glob.glob(pattern)))
+        finally:
+            os.chdir(cwd)
+        serial = bench('moa.scan (1 thread)',
+                       lambda: moa.scan.scan(pattern, root, threads=1)[0])
+        parallel = bench('moa.scan (%d threads)' % args.threads,
+                         lambda: moa.scan.scan(pattern, root,
+                                               threads=args.threads)[0])
+        if not (expected == serial == parallel):
+            print "ERROR: results differ"
+            sys.exit(1)
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()